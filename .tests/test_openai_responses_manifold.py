@@ -1,4 +1,8 @@
+import asyncio
 import json
+import logging
+import re
+import time
 from dataclasses import dataclass
 
 import pytest
@@ -102,6 +106,22 @@ def test_tool_transforms_and_mcp():
     ]
 
 
+def test_transform_tools_strict_is_idempotent():
+    params = {"type": "object", "properties": {"x": {"type": "string"}, "y": {"type": ["integer"]}}}
+    first = mod.ResponsesBody.transform_tools(
+        [{"spec": {"name": "f", "parameters": params}}], strict=True
+    )[0]["parameters"]
+    assert first["required"] == ["x", "y"]
+    assert first["properties"]["y"]["type"] == ["integer", "null"]
+    assert mod.ResponsesBody._is_strict_parameters(first)
+    assert params == {"type": "object", "properties": {"x": {"type": "string"}, "y": {"type": ["integer"]}}}
+    again = mod.ResponsesBody.transform_tools(
+        [{"spec": {"name": "f", "parameters": first}}], strict=True
+    )[0]
+    assert again["strict"] is True and again["parameters"] == first
+    assert not mod.ResponsesBody._is_strict_parameters({"properties": {}, "required": []})
+
+
 @pytest.mark.parametrize("item_type", ["", "a", "bad!", "x" * 31])
 def test_create_marker_rejects_bad_types(item_type):
     """Ensure invalid item_type values raise."""
@@ -160,6 +180,21 @@ def test_duplicate_persistence(dummy_chats, monkeypatch):
     assert ids == ["A" * 16, "A" * 16]
 
 
+def test_persisted_items_stamped_with_epoch_time(dummy_chats, monkeypatch):
+    dummy_chats["c1"] = {"history": {"messages": {}}}
+    try:
+        with monkeypatch.context() as mp:
+            mp.setenv("TZ", "Asia/Tokyo")  # non-UTC host
+            time.tzset()
+            before = int(time.time())
+            mod.persist_openai_response_items("c1", "m1", [{"type": "ab"}], "model")
+            after = int(time.time())
+    finally:
+        time.tzset()
+    (item,) = dummy_chats["c1"]["openai_responses_pipe"]["items"].values()
+    assert before <= item["created_at"] <= after
+
+
 def test_transform_messages_various(monkeypatch):
     monkeypatch.setattr(mod, "fetch_openai_response_items", lambda *a, **k: {})
     msgs = [
@@ -240,3 +275,677 @@ def test_transform_tools_dedup_and_unknown():
 )
 def test_build_mcp_tools_invalid(payload):
     assert mod.ResponsesBody._build_mcp_tools(payload) == []
+
+
+async def test_native_function_calling_single_flight(monkeypatch):
+    calls = []
+
+    def fake_enable(model_id):
+        calls.append(model_id)
+        time.sleep(0.05)
+        return True
+
+    monkeypatch.setattr(mod, "enable_native_function_calling", fake_enable)
+    pipe = mod.Pipe()
+    results = await asyncio.gather(
+        pipe._ensure_native_function_calling("openai_responses.gpt-4o"),
+        pipe._ensure_native_function_calling("openai_responses.gpt-4o"),
+    )
+    assert results == [True, True]
+    assert calls == ["openai_responses.gpt-4o"]
+    assert pipe._native_fc_inflight == {}
+
+    # Already-checked models are served from the TTL cache without a DB hit.
+    assert await pipe._ensure_native_function_calling("openai_responses.gpt-4o") is False
+    assert len(calls) == 1
+
+
+def test_ttl_cache_expiry_and_eviction(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(mod.time, "monotonic", lambda: now[0])
+    cache = mod.TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" becomes most recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    now[0] += 11
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+
+def test_from_completions_single_pass(dummy_chats):
+    dummy_chats["c1"] = {"history": {"messages": {}}}
+    marker = mod.persist_openai_response_items(
+        "c1", "m1", [{"type": "function_call", "name": "calc", "arguments": "{}"}], "model"
+    )
+    body = mod.CompletionsBody(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": "first"},
+            {"role": "user", "content": "hi"},
+            {"role": "assistant", "content": "before" + marker + "after"},
+            {"role": "system", "content": "last"},
+        ],
+    )
+    out = mod.ResponsesBody.from_completions(body, chat_id="c1", openwebui_model_id="model")
+    assert out.instructions == "last"
+    assert [i.get("role", i.get("type")) for i in out.input] == [
+        "user",
+        "assistant",
+        "function_call",
+        "assistant",
+    ]
+
+
+def test_lazy_str_skipped_below_session_level():
+    calls = []
+    logger = mod.SessionLogger.get_logger("lazy_str_test")
+    token = mod.SessionLogger.log_level.set(mod.logging.INFO)
+    try:
+        logger.debug("%s", mod.LazyStr(lambda: calls.append(1) or "x"))
+    finally:
+        mod.SessionLogger.log_level.reset(token)
+    assert calls == []
+
+
+async def test_http_session_shared_across_pipes(monkeypatch):
+    monkeypatch.setattr(mod, "_HTTP_SESSION", None)
+    first = await mod.Pipe()._get_or_init_http_session()
+    try:
+        assert await mod.Pipe()._get_or_init_http_session() is first
+    finally:
+        await first.close()
+
+
+async def test_streaming_request_parses_split_sse_frames(monkeypatch):
+    raw = (
+        b": keep-alive\r\n\r\nevent: response.created\r\n"
+        b'data: {"type": "a"}\r\n\r\ndata:{"type":"b"}  \n'
+        b"data: [DONE]\n"
+        b'data: {"type": "never"}\n'
+    )
+
+    class FakeContent:
+        async def iter_chunked(self, size):
+            for i in range(0, len(raw), 7):
+                yield raw[i : i + 7]
+
+    class FakeResponse:
+        content = FakeContent()
+
+        def raise_for_status(self):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    class FakeSession:
+        def post(self, url, data, headers):
+            assert json.loads(data) == {"model": "gpt-4o"}
+            return FakeResponse()
+
+    pipe = mod.Pipe()
+
+    async def fake_session():
+        return FakeSession()
+
+    monkeypatch.setattr(pipe, "_get_or_init_http_session", fake_session)
+    events = [
+        e
+        async for e in pipe.send_openai_responses_streaming_request(
+            {"model": "gpt-4o"}, "key", "https://api.example.com/v1"
+        )
+    ]
+    assert events == [{"type": "a"}, {"type": "b"}]
+
+
+async def test_streaming_request_accepts_lone_surrogate_escapes(monkeypatch):
+    raw = b'data: {"type": "delta", "delta": "cut \\ud83d"}\n\ndata: [DONE]\n'
+
+    class FakeContent:
+        async def iter_chunked(self, size):
+            yield raw
+
+    class FakeResponse:
+        content = FakeContent()
+
+        def raise_for_status(self):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    class FakeSession:
+        def post(self, url, data, headers):
+            return FakeResponse()
+
+    pipe = mod.Pipe()
+
+    async def fake_session():
+        return FakeSession()
+
+    monkeypatch.setattr(pipe, "_get_or_init_http_session", fake_session)
+    events = [
+        e
+        async for e in pipe.send_openai_responses_streaming_request(
+            {"model": "gpt-4o"}, "key", "https://api.example.com/v1"
+        )
+    ]
+    assert events == [{"type": "delta", "delta": "cut \ud83d"}]
+
+
+def test_encode_request_body_lone_surrogate_with_orjson():
+    body = {"input": "cut emoji \ud83d"}
+    assert json.loads(mod._encode_request_body(body)) == body
+
+
+def test_status_block_indents_multiline_subitems():
+    status = mod.ExpandableStatusIndicator()
+    status._items = [("Step", ["first\nsecond\n\n  third"])]
+    block = status._render_status_block()
+    assert "- **Step**\n  - first\n    second\n\n      third\n\n---" in block
+
+
+@pytest.mark.parametrize(
+    "item, expected_title",
+    [
+        ({"type": "reasoning"}, None),
+        ({"type": "mcp_call"}, "🌐 Let me query the MCP server…"),
+        ({"type": "web_search_call", "action": {"type": "search", "query": "q"}}, "🔍 Searching the web for: `q`"),
+        ({"type": "web_search_call"}, "🔍 Hmm, let me quickly check online…"),
+        ({"type": "custom_call", "name": "x"}, "Running `x`"),
+    ],
+)
+def test_describe_output_item_titles(item, expected_title):
+    assert mod.describe_output_item(item)[0] == expected_title
+
+
+def test_describe_output_item_function_call():
+    title, content = mod.describe_output_item(
+        {"type": "function_call", "name": "calc", "arguments": '{"a": 1}'}
+    )
+    assert title == "🛠️ Running the calc tool…"
+    assert "calc(a=1)" in content
+
+
+def test_generate_item_id_alphabet():
+    ids = {mod.generate_item_id() for _ in range(200)}
+    assert len(ids) == 200
+    for uid in ids:
+        assert len(uid) == mod.ULID_LENGTH
+        assert set(uid) <= set(mod.CROCKFORD_ALPHABET)
+
+
+async def test_status_indicator_replaces_leading_block():
+    status = mod.ExpandableStatusIndicator()
+    msg = await status.add("", "One")
+    msg += "answer text"
+    msg = await status.add(msg, "Two")
+    assert msg.count('<details type="status"') == 1
+    assert msg.startswith('<details type="status" done="false">\n<summary>Two</summary>')
+    assert msg.endswith("---</details>answer text")
+
+    status = mod.ExpandableStatusIndicator()
+    msg = await status.add("plain reply", "Late")
+    assert msg.startswith('<details type="status"') and msg.endswith("plain reply")
+
+
+async def test_chat_message_coalescer_keeps_latest_and_order():
+    sent = []
+
+    async def emit(event):
+        sent.append(event)
+
+    coalescer = mod.ChatMessageCoalescer(emit, interval=60)
+    for text in ("a", "ab", "abc"):
+        await coalescer({"type": "chat:message", "data": {"content": text}})
+    assert [e["data"]["content"] for e in sent] == ["a"]
+
+    await coalescer({"type": "chat:completion", "data": {"done": True}})
+    assert [e["type"] for e in sent] == ["chat:message", "chat:message", "chat:completion"]
+    assert sent[1]["data"]["content"] == "abc"
+
+
+async def test_chat_message_coalescer_flushes_after_interval():
+    sent = []
+
+    async def emit(event):
+        sent.append(event["data"]["content"])
+
+    coalescer = mod.ChatMessageCoalescer(emit, interval=0.01)
+    await coalescer({"type": "chat:message", "data": {"content": "a"}})
+    await coalescer({"type": "chat:message", "data": {"content": "ab"}})
+    await asyncio.sleep(0.05)
+    assert sent == ["a", "ab"]
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://www.Example.com/a", "example.com"),
+        ("https://web.dev/articles", "web.dev"),
+        ("https://wikipedia.org", "wikipedia.org"),
+    ],
+)
+def test_url_domain(url, expected):
+    assert mod.url_domain(url) == expected
+
+
+def test_extract_markers_parsed_matches_parse_marker():
+    markers = [
+        mod.create_marker("function_call", ulid="A" * 16, model_id="m", metadata={"k": "v"}),
+        mod.create_marker("reasoning", ulid="B" * 16),
+    ]
+    text = "x".join(mod.wrap_marker(m) for m in markers)
+    assert mod.extract_markers(text, parsed=True) == [mod.parse_marker(m) for m in markers]
+
+
+async def test_streaming_loop_persists_citations_and_flushes(monkeypatch):
+    upserts = []
+
+    class DummyChats:
+        @staticmethod
+        def upsert_message_to_chat_by_id_and_message_id(cid, mid, data):
+            upserts.append((cid, mid, data))
+
+    monkeypatch.setattr(mod, "Chats", DummyChats)
+
+    async def fake_stream(self, request_body, api_key, base_url):
+        yield {"type": "response.output_text.delta", "delta": "Hello"}
+        yield {"type": "response.output_text.delta", "delta": " world"}
+        yield {
+            "type": "response.output_text.annotation.added",
+            "annotation": {"url": "https://www.example.com/a", "title": "A"},
+        }
+        yield {"type": "response.completed", "response": {"output": []}}
+
+    monkeypatch.setattr(mod.Pipe, "send_openai_responses_streaming_request", fake_stream)
+
+    sent = []
+
+    async def emit(event):
+        sent.append(event)
+
+    pipe = mod.Pipe()
+    body = mod.ResponsesBody(model="gpt-4o", input=[], stream=True)
+    result = await pipe._run_streaming_loop(
+        body, pipe.valves, emit, {"chat_id": "c1", "message_id": "m1", "model": {"id": "x"}}
+    )
+
+    assert result == "Hello world [1]"
+    assert [e["type"] for e in sent][-1] == "chat:completion"
+    assert [e for e in sent if e["type"] == "chat:message"][-1]["data"]["content"] == result
+    assert upserts[0][:2] == ("c1", "m1")
+    assert upserts[0][2]["sources"][0]["source"] == {"name": "example.com", "url": "https://www.example.com/a"}
+
+
+async def test_streaming_loop_releases_logs_when_persist_fails(monkeypatch):
+    class DummyChats:
+        @staticmethod
+        def upsert_message_to_chat_by_id_and_message_id(cid, mid, data):
+            raise RuntimeError("db down")
+
+    monkeypatch.setattr(mod, "Chats", DummyChats)
+
+    async def fake_stream(self, request_body, api_key, base_url):
+        yield {
+            "type": "response.output_text.annotation.added",
+            "annotation": {"url": "https://example.com/a", "title": "A"},
+        }
+        yield {"type": "response.completed", "response": {"output": []}}
+
+    monkeypatch.setattr(mod.Pipe, "send_openai_responses_streaming_request", fake_stream)
+
+    async def emit(event):
+        pass
+
+    sid = mod.SessionLogger.session_id.set("s-persist")
+    try:
+        mod.SessionLogger.logs["s-persist"].append(
+            logging.LogRecord("x", logging.INFO, __file__, 1, "buffered", None, None)
+        )
+        pipe = mod.Pipe()
+        body = mod.ResponsesBody(model="gpt-4o", input=[], stream=True)
+        with pytest.raises(RuntimeError, match="db down"):
+            await pipe._run_streaming_loop(
+                body, pipe.valves, emit, {"chat_id": "c1", "message_id": "m1", "model": {"id": "x"}}
+            )
+    finally:
+        mod.SessionLogger.session_id.reset(sid)
+    assert "s-persist" not in mod.SessionLogger.logs
+
+
+def test_mcp_tools_cached_per_valve_value(monkeypatch):
+    mod.build_mcp_tools_cached.cache_clear()
+    calls = []
+    real = mod.ResponsesBody._build_mcp_tools
+
+    def counting(raw):
+        calls.append(raw)
+        return real(raw)
+
+    monkeypatch.setattr(mod.ResponsesBody, "_build_mcp_tools", staticmethod(counting))
+    raw = json.dumps([{"server_label": "a", "server_url": "https://a"}])
+    first = mod.build_mcp_tools_cached(raw)
+    assert mod.build_mcp_tools_cached(raw) is first
+    assert calls == [raw]
+    assert first == ({"type": "mcp", "server_label": "a", "server_url": "https://a"},)
+    mod.build_mcp_tools_cached.cache_clear()
+
+
+async def test_prefetch_yields_in_order_and_reraises():
+    async def source():
+        yield 1
+        yield 2
+        raise RuntimeError("boom")
+
+    seen = []
+    with pytest.raises(RuntimeError, match="boom"):
+        async for item in mod.prefetch(source(), 1):
+            seen.append(item)
+    assert seen == [1, 2]
+
+
+async def test_prefetch_close_cancels_and_closes_source():
+    closed = []
+
+    async def source():
+        try:
+            for i in range(100):
+                yield i
+        finally:
+            closed.append(True)
+
+    gen = mod.prefetch(source(), 2)
+    assert await gen.__anext__() == 0
+    await gen.aclose()
+    assert closed == [True]
+
+
+def test_session_logs_buffer_snapshots_messages():
+    logger = mod.SessionLogger.get_logger("buffer_test")
+    sid = mod.SessionLogger.session_id.set("s-buffer")
+    lvl = mod.SessionLogger.log_level.set(mod.logging.INFO)
+    try:
+        payload = {"n": 1}
+        logger.info("payload=%s", payload)
+        logger.debug("hidden")
+        payload["n"] = 2
+        text = mod.SessionLogger.format_logs("s-buffer")
+    finally:
+        mod.SessionLogger.session_id.reset(sid)
+        mod.SessionLogger.log_level.reset(lvl)
+        mod.SessionLogger.logs.pop("s-buffer", None)
+    assert text.endswith("[INFO] payload={'n': 1}")
+    assert "hidden" not in text
+    assert mod.SessionLogger.format_logs("missing") == ""
+
+
+async def test_execute_function_calls_single_and_many():
+    async def add(a, b):
+        return a + b
+
+    def neg(a):
+        return -a
+
+    tools = {"add": {"callable": add}, "neg": {"callable": neg}}
+    one = await mod.Pipe._execute_function_calls(
+        [{"name": "add", "call_id": "c1", "arguments": '{"a": 1, "b": 2}'}], tools
+    )
+    assert one == [{"type": "function_call_output", "call_id": "c1", "output": "3"}]
+
+    many = await mod.Pipe._execute_function_calls(
+        [
+            {"name": "neg", "call_id": "c1", "arguments": '{"a": 4}'},
+            {"name": "missing", "call_id": "c2", "arguments": "{}"},
+        ],
+        tools,
+    )
+    assert [o["output"] for o in many] == ["-4", "Tool not found"]
+
+
+async def test_tool_arguments_keep_big_ints_exact():
+    arguments = '{"order_id": 123456789012345678901234}'
+
+    def lookup(order_id):
+        return repr(order_id)
+
+    outputs = await mod.Pipe._execute_function_calls(
+        [{"name": "lookup", "call_id": "c1", "arguments": arguments}],
+        {"lookup": {"callable": lookup}},
+    )
+    assert outputs[0]["output"] == "123456789012345678901234"
+    _, content = mod.describe_output_item(
+        {"type": "function_call", "name": "lookup", "arguments": arguments}
+    )
+    assert "lookup(order_id=123456789012345678901234)" in content
+
+
+def test_model_features_matches_feature_support():
+    assert mod.model_features("gpt-5") == frozenset(
+        f for f, models in mod.FEATURE_SUPPORT.items() if "gpt-5" in models
+    )
+    assert "reasoning" not in mod.model_features("gpt-4o")
+    assert mod.model_features("unknown-model") == frozenset()
+
+
+def test_input_as_list_wraps_text_once_and_keeps_identity():
+    body = mod.ResponsesBody(model="gpt-4o", input="hi")
+    items = mod.Pipe._input_as_list(body)
+    assert items == [{"role": "user", "content": "hi"}]
+    assert mod.Pipe._input_as_list(body) is items is body.input
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        ("openai_responses.gpt-5-thinking-high", ("gpt-5", "high")),
+        (" O3-Mini-High ", ("o3-mini", "high")),
+        ("GPT-4o", ("gpt-4o", None)),
+    ],
+)
+def test_resolve_model_alias(raw, expected):
+    assert mod.resolve_model_alias(raw) == expected
+    body = mod.CompletionsBody(model=raw, messages=[])
+    assert body.model == expected[0]
+    assert getattr(body, "reasoning_effort", None) == expected[1]
+
+
+@pytest.mark.parametrize(
+    "model",
+    ["o3-2025-04-16", "gpt-4o", "gpt-4.1-mini-2025-04-14", "x-2025-4-16", "x-2025-04-1a", "2025-04-16", ""],
+)
+def test_get_model_family_matches_date_regex(model):
+    assert mod.get_model_family(model) == re.sub(r"-\d{4}-\d{2}-\d{2}$", "", model)
+
+
+def test_merge_valves_skips_copy_without_overrides():
+    pipe = mod.Pipe()
+    inherit = pipe.UserValves()
+    assert pipe._merge_valves(pipe.valves, inherit) is pipe.valves
+
+    merged = pipe._merge_valves(pipe.valves, pipe.UserValves(LOG_LEVEL="DEBUG"))
+    assert merged is not pipe.valves
+    assert merged.LOG_LEVEL == "DEBUG"
+    assert merged.MODEL_ID == pipe.valves.MODEL_ID
+
+
+def test_valves_are_frozen():
+    pipe = mod.Pipe()
+    with pytest.raises(ValueError):  # pydantic ValidationError
+        pipe.valves.LOG_LEVEL = "DEBUG"
+    assert pipe.valves.model_copy(update={"LOG_LEVEL": "DEBUG"}).LOG_LEVEL == "DEBUG"
+
+
+async def test_pipes_lists_parsed_model_ids():
+    pipe = mod.Pipe()
+    pipe.valves = pipe.Valves(MODEL_ID=" gpt-4o, ,o3 ,")
+    assert await pipe.pipes() == [
+        {"id": "gpt-4o", "name": "OpenAI: gpt-4o"},
+        {"id": "o3", "name": "OpenAI: o3"},
+    ]
+
+
+@pytest.mark.parametrize("obj", [{"a": [1, "é"], "b": None}, {"big": 2**70}])
+def test_json_dumps_debug_roundtrips(obj):
+    assert json.loads(mod._json_dumps_debug(obj)) == obj
+    compact = mod._json_dumps_debug(obj, indent=False)
+    assert "\n" not in compact and json.loads(compact) == obj
+
+
+def test_describe_output_item_formats_args_like_json_dumps():
+    args = {"q": "café \"x\"", "n": [1, 2.5, None], "flag": True}
+    _, content = mod.describe_output_item(
+        {"type": "function_call", "name": "search", "arguments": json.dumps(args)}
+    )
+    expected = ", ".join(f"{k}={json.dumps(v)}" for k, v in args.items())
+    assert f"search({expected})" in content
+
+
+async def test_execute_function_calls_cancels_siblings_on_error(monkeypatch):
+    monkeypatch.setattr(mod, "TOOL_CALL_CONCURRENCY", 2)
+    running, cancelled = [], []
+
+    async def slow():
+        running.append(1)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def boom():
+        await asyncio.sleep(0)
+        raise RuntimeError("tool failed")
+
+    tools = {"slow": {"callable": slow}, "boom": {"callable": boom}}
+    calls = [
+        {"name": "slow", "call_id": "c1", "arguments": "{}"},
+        {"name": "boom", "call_id": "c2", "arguments": "{}"},
+        {"name": "slow", "call_id": "c3", "arguments": "{}"},
+    ]
+    with pytest.raises(RuntimeError, match="tool failed") as excinfo:
+        await mod.Pipe._execute_function_calls(calls, tools)
+    # The group that wraps the same error is not chained onto it.
+    assert excinfo.value.__suppress_context__
+    # Every slow call that got a slot was cancelled instead of left running.
+    assert running and cancelled == running
+
+
+async def test_execute_function_calls_caps_concurrency(monkeypatch):
+    monkeypatch.setattr(mod, "TOOL_CALL_CONCURRENCY", 2)
+    active, peak = 0, 0
+
+    async def tool():
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return "ok"
+
+    calls = [{"name": "t", "call_id": f"c{i}", "arguments": "{}"} for i in range(5)]
+    outputs = await mod.Pipe._execute_function_calls(calls, {"t": {"callable": tool}})
+    assert [o["call_id"] for o in outputs] == [c["call_id"] for c in calls]
+    assert peak == 2
+
+
+async def test_chat_message_coalescer_waits_for_slow_delayed_send():
+    sent = []
+
+    async def emit(event):
+        content = event["data"].get("content", event["type"])
+        if content == "ab":
+            await asyncio.sleep(0.05)  # slow send of the delayed update
+        sent.append(content)
+
+    coalescer = mod.ChatMessageCoalescer(emit, interval=0.01)
+    await coalescer({"type": "chat:message", "data": {"content": "a"}})
+    await coalescer({"type": "chat:message", "data": {"content": "ab"}})
+    await asyncio.sleep(0.02)  # the delayed send of "ab" is now in progress
+    await coalescer({"type": "chat:message", "data": {"content": "abc"}})
+    await coalescer({"type": "chat:completion", "data": {}})
+    assert sent == ["a", "ab", "abc", "chat:completion"]
+
+
+async def test_chat_message_coalescer_reraises_delayed_send_error():
+    async def emit(event):
+        if event["data"]["content"] == "ab":
+            raise RuntimeError("emit failed")
+
+    coalescer = mod.ChatMessageCoalescer(emit, interval=0.01)
+    await coalescer({"type": "chat:message", "data": {"content": "a"}})
+    await coalescer({"type": "chat:message", "data": {"content": "ab"}})
+    await asyncio.sleep(0.03)
+    with pytest.raises(RuntimeError, match="emit failed"):
+        await coalescer.flush()
+
+
+@pytest.mark.parametrize("body", [{"seed": 2**70}, {"metadata": {1: "a"}}])
+def test_encode_request_body_falls_back_to_stdlib(body):
+    assert mod._encode_request_body(body) == json.dumps(
+        body, separators=(",", ":")
+    ).encode()
+
+
+def test_encode_request_body_stdlib_escapes_lone_surrogates(monkeypatch):
+    monkeypatch.setattr(mod, "orjson", None)
+    body = {"input": [{"type": "input_text", "text": "cut emoji \ud83d", "note": "é"}]}
+    data = mod._encode_request_body(body)
+    assert data.isascii() and json.loads(data) == body
+
+
+def test_session_logger_survives_bad_log_messages(monkeypatch):
+    monkeypatch.setattr(mod.logging, "raiseExceptions", False)  # handlers report errors quietly
+    logger = mod.SessionLogger.get_logger("bad_message_test")
+    sid = mod.SessionLogger.session_id.set("s-bad")
+    lvl = mod.SessionLogger.log_level.set(mod.logging.DEBUG)
+
+    def boom():
+        raise RuntimeError("boom")
+
+    try:
+        logger.debug("two args %s %s", 1)  # %-format mismatch
+        logger.debug("lazy %s", mod.LazyStr(boom))
+        logger.info("still logging")
+        text = mod.SessionLogger.format_logs("s-bad")
+    finally:
+        mod.SessionLogger.session_id.reset(sid)
+        mod.SessionLogger.log_level.reset(lvl)
+        mod.SessionLogger.logs.pop("s-bad", None)
+    assert "unformattable log message" in text
+    assert text.endswith("[INFO] still logging")
+
+
+async def test_streaming_loop_closes_stream_after_completed(monkeypatch):
+    monkeypatch.setattr(mod, "Chats", type("DummyChats", (), {}))
+    closed = []
+
+    async def fake_stream(self, request_body, api_key, base_url):
+        try:
+            yield {"type": "response.completed", "response": {"output": []}}
+            await asyncio.Event().wait()  # the connection would stay open
+            yield {"type": "never"}
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(mod.Pipe, "send_openai_responses_streaming_request", fake_stream)
+
+    async def emit(event):
+        pass
+
+    pipe = mod.Pipe()
+    body = mod.ResponsesBody(model="gpt-4o", input=[], stream=True)
+    await pipe._run_streaming_loop(body, pipe.valves, emit, {"model": {"id": "x"}})
+
+    # The source was closed and the reader task finished before the loop returned.
+    assert closed == [True]
+    assert asyncio.all_tasks() == {asyncio.current_task()}
@@ -3,7 +3,7 @@ title: Web Search
 id: web_search_toggle_filter
 description: Instruct the model to search the web for the latest information.
 required_open_webui_version: 0.6.10
-version: 0.2.0
+version: 0.2.1
 
 Note: Designed to work with the OpenAI Responses manifold
       https://github.com/jrkropp/open-webui-developer-toolkit/tree/main/functions/pipes/openai_responses_manifold
@@ -14,7 +14,7 @@ from typing import Any, Dict, Optional
 from pydantic import BaseModel, Field
 
 # Models that already include the native web_search tool
-WEB_SEARCH_MODELS = {
+WEB_SEARCH_MODELS = frozenset({
     "openai_responses.gpt-4.1",
     "openai_responses.gpt-4.1-mini",
     "openai_responses.gpt-4o",
@@ -27,14 +27,20 @@ WEB_SEARCH_MODELS = {
     "openai_responses.gpt-5-mini",
     "openai_responses.gpt-5-thinking",
     "openai_responses.gpt-5-thinking-high",
-}
+})
 
-SUPPORT_TOOL_CHOICE_PARAMETER = {
+SUPPORT_TOOL_CHOICE_PARAMETER = frozenset({
     "openai_responses.gpt-4.1",
     "openai_responses.gpt-4.1-mini",
     "openai_responses.gpt-4o",
     "openai_responses.gpt-4o-mini",
-}
+})
+
+# Developer nudge for models that cannot be forced via tool_choice
+WEB_SEARCH_NUDGE = (
+    "Web search is enabled. "
+    "Use the `web_search` tool whenever you need fresh information."
+)
 
 class Filter:
     # ── User‑configurable knobs (valves) ──────────────────────────────
@@ -72,22 +78,18 @@ class Filter:
             # Activate the custom OpenAI Responses search feature
             __metadata__["features"].setdefault("openai_responses", {})["web_search"] = True
 
+        model = body.get("model")
+
         # --- Tell the model to search (forced vs. gentle nudge)
-        if body.get("model") in SUPPORT_TOOL_CHOICE_PARAMETER:
+        if model in SUPPORT_TOOL_CHOICE_PARAMETER:
             body["tool_choice"] = {"type": "web_search_preview"}
         else:
             body.setdefault("messages", []).append(
-                {
-                    "role": "developer",
-                    "content": (
-                        "Web search is enabled. "
-                        "Use the `web_search` tool whenever you need fresh information."
-                    ),
-                }
+                {"role": "developer", "content": WEB_SEARCH_NUDGE}
             )
 
         # Switch to default search-compatible model if needed
-        if body.get("model") not in WEB_SEARCH_MODELS:
+        if model not in WEB_SEARCH_MODELS:
             body["model"] = self.valves.DEFAULT_SEARCH_MODEL
 
         return body
@@ -5,7 +5,7 @@ author: OpenAI Codex
 funding_url: https://github.com/jrkropp/open-webui-developer-toolkit
 description:
     Emit citation blocks containing the contents of the input arguments passed into a pipe.
-version: 0.1.1
+version: 0.1.2
 license: MIT
 notes:
     - Sensitive headers (such as 'authorization', 'cookie', and similar) are redacted by default
@@ -22,12 +22,12 @@ from typing import Any, AsyncGenerator, Awaitable, Callable, Optional
 from pydantic import BaseModel, Field
 from fastapi import Request
 
-SENSITIVE_HEADERS = {
+SENSITIVE_HEADERS = frozenset({
     "authorization",
     "cookie",
     "x-forwarded-for",
     "x-envoy-external-address",
-}
+})
 
 
 class Pipe:
@@ -91,10 +91,13 @@ class Pipe:
 def _sanitize_request(request: Request, redact: bool) -> dict[str, Any]:
     """Return a sanitized representation of ``request``."""
 
-    headers = {
-        k: ("[REDACTED]" if redact and k.lower() in SENSITIVE_HEADERS else v)
-        for k, v in request.headers.items()
-    }
+    if redact:
+        headers = {
+            k: ("[REDACTED]" if k.lower() in SENSITIVE_HEADERS else v)
+            for k, v in request.headers.items()
+        }
+    else:
+        headers = dict(request.headers.items())
     return {
         "method": request.method,
         "url": str(request.url),
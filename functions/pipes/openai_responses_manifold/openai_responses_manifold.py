@@ -6,7 +6,7 @@ author_url: https://github.com/jrkropp
 git_url: https://github.com/jrkropp/open-webui-developer-toolkit/blob/main/functions/pipes/openai_responses_manifold/openai_responses_manifold.py
 description: Brings OpenAI Response API support to Open WebUI, enabling features not possible via Completions API.
 required_open_webui_version: 0.6.3
-version: 0.8.28
+version: 0.8.29
 license: MIT
 """
 
@@ -17,27 +17,32 @@ from __future__ import annotations
 # ─────────────────────────────────────────────────────────────────────────────
 # Standard library, third-party, and Open WebUI imports
 # Standard library imports
-import textwrap
 from typing import Tuple
 import asyncio
+import contextlib
 import datetime
+import functools
 import inspect
 import json
 import logging
 import os
 import re
 import sys
-import secrets
 import time
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict, deque
 from contextvars import ContextVar
-from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Literal, Optional, Union
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Literal, Optional, Union
 from urllib.parse import urlparse
 
 # Third-party imports
 import aiohttp
 from fastapi import Request
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+try:  # Optional faster JSON codec; Open WebUI does not install it by default.
+    import orjson
+except ImportError:  # pragma: no cover - fallback to stdlib json
+    orjson = None
 
 # Open WebUI internals
 from open_webui.models.chats import Chats
@@ -59,11 +64,108 @@ FEATURE_SUPPORT = {
     "deep_research": {"o3-deep-research", "o4-mini-deep-research"}, # OpenAI's deep research models.
 }
 
+# FEATURE_SUPPORT inverted once at import: model family → frozenset of supported features.
+MODEL_FEATURES: dict[str, frozenset[str]] = {
+    model: frozenset(feature for feature, models in FEATURE_SUPPORT.items() if model in models)
+    for model in set().union(*FEATURE_SUPPORT.values())
+}
+
+# Pseudo model IDs → (real model, reasoning effort).  Values are immutable tuples, so they are shared as-is.
+MODEL_ALIASES: dict[str, Tuple[str, Optional[str]]] = {
+    # GPT-5 Thinking family
+    "gpt-5-thinking": ("gpt-5", None),
+    "gpt-5-thinking-minimal": ("gpt-5", "minimal"),
+    "gpt-5-thinking-high": ("gpt-5", "high"),
+    "gpt-5-thinking-mini": ("gpt-5-mini", None),
+    "gpt-5-thinking-mini-minimal": ("gpt-5-mini", "minimal"),
+    "gpt-5-thinking-nano": ("gpt-5-nano", None),
+    "gpt-5-thinking-nano-minimal": ("gpt-5-nano", "minimal"),
+
+    # Placeholder router
+    "gpt-5-auto": ("gpt-5-chat-latest", None),
+
+    # Backwards compatibility
+    "o3-mini-high": ("o3-mini", "high"),
+    "o4-mini-high": ("o4-mini", "high"),
+}
+
+# Chat Completions fields dropped by ResponsesBody.from_completions.
+UNSUPPORTED_COMPLETIONS_FIELDS = frozenset({
+    # Fields that are not supported by OpenAI Responses API
+    "frequency_penalty", "presence_penalty", "seed", "logit_bias",
+    "logprobs", "top_logprobs", "n", "stop",
+    "response_format", # Replaced with 'text' in Responses API
+    "suffix", # Responses API does not support suffix
+    "stream_options", # Responses API does not support stream options
+    "audio", # Responses API does not support audio input
+    "function_call", # Deprecated in favor of 'tool_choice'.
+    "functions", # Deprecated in favor of 'tools'.
+
+    # Fields that are dropped and manually handled in step 2.
+    "reasoning_effort", "max_tokens",
+})
+
+# Chat Completions user content blocks → Responses API input blocks (others pass through unchanged).
+USER_BLOCK_TRANSFORMS: dict[str, Callable[[dict], dict]] = {
+    "text":       lambda b: {"type": "input_text",  "text": b.get("text", "")},
+    "image_url":  lambda b: {"type": "input_image", "image_url": (b.get("image_url") or {}).get("url")},
+    "input_file": lambda b: {"type": "input_file",  "file_id": b.get("file_id")},
+}
+
+# Status titles for completed output items that need no per-item detail (None = no status line).
+ITEM_STATUS_TITLES: dict[str, Optional[str]] = {
+    "file_search_call": "📂 Let me skim those files…",
+    "image_generation_call": "🎨 Let me create that image…",
+    "local_shell_call": "💻 Let me run that command…",
+    "mcp_call": "🌐 Let me query the MCP server…",
+    "reasoning": None,  # Don't emit a title for reasoning items
+}
+
+# SSE event types _run_streaming_loop acts on after the text delta fast path; all others are skipped.
+STREAM_HANDLED_EVENTS = frozenset({
+    "response.reasoning_summary_text.done",
+    "response.output_text.annotation.added",
+    "response.output_item.added",
+    "response.output_item.done",
+    "response.completed",
+})
+
+# Maximum number of tool calls from one model turn that run at the same time.
+TOOL_CALL_CONCURRENCY = 8
+
+# Maximum number of SSE events read ahead of the streaming loop.
+STREAM_PREFETCH_EVENTS = 64
+
+# Minimum spacing between streamed chat:message updates; faster updates are coalesced.
+CHAT_MESSAGE_EMIT_INTERVAL = 0.02  # seconds
+
+# Valve LOG_LEVEL names → logging levels (resolved once instead of getattr per request).
+LOG_LEVELS = {
+    name: getattr(logging, name) for name in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+}
+
+# GLOBAL_LOG_LEVEL read and validated once; unknown names fall back to INFO.
+DEFAULT_LOG_LEVEL = (os.getenv("GLOBAL_LOG_LEVEL") or "INFO").strip().upper()
+if DEFAULT_LOG_LEVEL not in LOG_LEVELS:
+    DEFAULT_LOG_LEVEL = "INFO"
+
+# Open WebUI "regenerate" stub messages → text.verbosity value.
+VERBOSITY_DIRECTIVES = {"add details": "high", "more concise": "low"}
+
+# How long a model confirmed to use native function calling is trusted before re-checking the DB.
+NATIVE_FUNCTION_CALLING_CACHE_TTL = 300  # seconds
+
+# Shared aiohttp session (see Pipe._get_or_init_http_session).  Created lazily on first request.
+_HTTP_SESSION: aiohttp.ClientSession | None = None
+
 DETAILS_RE = re.compile(
     r"<details\b[^>]*>.*?</details>|!\[.*?]\(.*?\)",
     re.S | re.I,
 )
 
+# Bold headers in reasoning summaries (the last one becomes the status title).
+BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 3. Data Models
 # ─────────────────────────────────────────────────────────────────────────────
@@ -84,39 +186,10 @@ class CompletionsBody(BaseModel):
     def normalize_model(self) -> "CompletionsBody":
         """Normalize model: strip 'openai_responses.' prefix and map '-high' pseudo-models."""
         
-        # Remove prefix if present
-        m = (self.model or "").strip()
-        if m.startswith("openai_responses."):
-            m = m[len("openai_responses."):]
-
-        key = m.lower()
-
-        # Alias mapping: pseudo ID -> (real model, reasoning effort)
-        aliases = {
-            # GPT-5 Thinking family
-            "gpt-5-thinking": ("gpt-5", None),
-            "gpt-5-thinking-minimal": ("gpt-5", "minimal"),
-            "gpt-5-thinking-high": ("gpt-5", "high"),
-            "gpt-5-thinking-mini": ("gpt-5-mini", None),
-            "gpt-5-thinking-mini-minimal": ("gpt-5-mini", "minimal"),
-            "gpt-5-thinking-nano": ("gpt-5-nano", None),
-            "gpt-5-thinking-nano-minimal": ("gpt-5-nano", "minimal"),
-
-            # Placeholder router
-            "gpt-5-auto": ("gpt-5-chat-latest", None),
-
-            # Backwards compatibility
-            "o3-mini-high": ("o3-mini", "high"),
-            "o4-mini-high": ("o4-mini", "high"),
-        }
-
-        if key in aliases:
-            real, effort = aliases[key]
-            self.model = real
-            if effort:
-                self.reasoning_effort = effort  # type: ignore[assignment]
-        else:
-            self.model = key  # pass through official IDs as lowercase
+        real, effort = resolve_model_alias(self.model or "")
+        self.model = real
+        if effort:
+            self.reasoning_effort = effort  # type: ignore[assignment]
 
         return self
 
@@ -207,15 +280,23 @@ class ResponsesBody(BaseModel):
         # 2. strict-mode hardening for the bits we just converted ----------
         if strict:
             for tool in converted:
-                params = tool.setdefault("parameters", {})
-                props  = params.setdefault("properties", {})
+                if ResponsesBody._is_strict_parameters(tool.get("parameters")):
+                    tool["strict"] = True  # already hardened (e.g. reused tool spec)
+                    continue
+                # Copy only the levels we rewrite so the caller's tool spec is left untouched
+                params = dict(tool.get("parameters") or {})
+                props: dict[str, dict] = {}
+                for name, schema in (params.get("properties") or {}).items():
+                    schema = props[name] = dict(schema)   # copy + nullable in one pass
+                    t = schema.get("type")
+                    if isinstance(t, str):
+                        schema["type"] = [t, "null"]
+                    elif isinstance(t, list) and "null" not in t:
+                        schema["type"] = t + ["null"]
+                params["properties"] = props
                 params["required"] = list(props)
                 params["additionalProperties"] = False
-                for schema in props.values():
-                    t = schema.get("type")
-                    schema["type"] = [t, "null"] if isinstance(t, str) else (
-                        t + ["null"] if isinstance(t, list) and "null" not in t else t
-                    )
+                tool["parameters"] = params
                 tool["strict"] = True
 
         # 3. deduplicate ---------------------------------------------------
@@ -229,6 +310,24 @@ class ResponsesBody(BaseModel):
     # -----------------------------------------------------------------------
     # Helper: turn the JSON string into valid MCP tool dicts
     # -----------------------------------------------------------------------
+    @staticmethod
+    def _is_strict_parameters(params: Any) -> bool:
+        """Return ``True`` if ``params`` already has the shape strict mode produces.
+
+        That is: ``additionalProperties`` is ``False``, every property is
+        ``required`` (in order) and every property type list includes ``"null"``.
+        """
+        if not isinstance(params, dict) or params.get("additionalProperties") is not False:
+            return False
+        props = params.get("properties")
+        if not isinstance(props, dict) or params.get("required") != list(props):
+            return False
+        for schema in props.values():
+            t = schema.get("type")
+            if not (isinstance(t, list) and "null" in t):
+                return False
+        return True
+
     @staticmethod
     def _build_mcp_tools(mcp_json: str) -> list[dict]:
         """
@@ -301,37 +400,35 @@ class ResponsesBody(BaseModel):
         -------
         List[dict] : The fully-formed `input` list for the OpenAI Responses API.
         """
+        openai_input, _ = ResponsesBody._build_input_and_instructions(
+            messages, chat_id=chat_id, openwebui_model_id=openwebui_model_id
+        )
+        return openai_input
 
-        required_item_ids: set[str] = set()
+    @staticmethod
+    def _build_input_and_instructions(
+        messages: List[Dict[str, Any]],
+        chat_id: Optional[str] = None,
+        openwebui_model_id: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Single pass over ``messages`` returning ``(input, instructions)``.
 
-        # Gather all markers from assistant messages (if both IDs are provided)
-        if chat_id and openwebui_model_id:
-            for m in messages:
-                if (
-                    m.get("role") == "assistant"
-                    and m.get("content")
-                    and contains_marker(m["content"])
-                ):
-                    for mk in extract_markers(m["content"], parsed=True):
-                        required_item_ids.add(mk["ulid"])
-
-        # Fetch persisted items if both IDs are provided and there are encoded item IDs
-        items_lookup: dict[str, dict] = {}
-        if chat_id and openwebui_model_id and required_item_ids:
-            items_lookup = fetch_openai_response_items(
-                chat_id,
-                list(required_item_ids),
-                openwebui_model_id=openwebui_model_id,
-            )
+        ``instructions`` is the content of the last system message (or ``None``).
+        Persisted item markers get a reserved slot in ``input`` while walking the
+        messages; the slots are filled after one batched fetch at the end.
+        """
+        openai_input: list[dict | None] = []
+        pending_items: list[tuple[int, str]] = []  # (slot index in openai_input, item ULID)
+        instructions: Optional[str] = None
 
-        # Build the OpenAI input array
-        openai_input: list[dict] = []
         for msg in messages:
             role = msg.get("role")
             raw_content = msg.get("content", "")
 
-            # Skip system messages; they belong in `instructions`
+            # System messages belong in `instructions`; the last one wins
             if role == "system":
+                instructions = raw_content
                 continue
 
             # -------- user message ---------------------------------------- #
@@ -342,19 +439,14 @@ class ResponsesBody(BaseModel):
                     content_blocks = [{"type": "text", "text": content_blocks}]
 
                 # Only transform known types; leave all others unchanged
-                block_transform = {
-                    "text":       lambda b: {"type": "input_text",  "text": b.get("text", "")},
-                    "image_url":  lambda b: {"type": "input_image", "image_url": b.get("image_url", {}).get("url")},
-                    "input_file": lambda b: {"type": "input_file",  "file_id": b.get("file_id")},
-                }
-
-                openai_input.append({
-                    "role": "user",
-                    "content": [
-                        block_transform.get(block.get("type"), lambda b: b)(block)
-                        for block in content_blocks if block
-                    ],
-                })
+                transforms = USER_BLOCK_TRANSFORMS
+                content = []
+                for block in content_blocks:
+                    if block:
+                        transform = transforms.get(block.get("type"))
+                        content.append(transform(block) if transform else block)
+
+                openai_input.append({"role": "user", "content": content})
                 continue
 
             # -------- developer message --------------------------------- #
@@ -374,17 +466,20 @@ class ResponsesBody(BaseModel):
                 content = raw_content
 
             if contains_marker(content):
-                for segment in split_text_by_markers(content):
-                    if segment["type"] == "marker":
-                        mk = parse_marker(segment["marker"])
-                        item = items_lookup.get(mk["ulid"])
-                        if item is not None:
-                            openai_input.append(item)
-                    elif segment["type"] == "text" and segment["text"].strip():
+                # One regex pass: text between markers becomes assistant output and
+                # each marker's ULID is read straight from its match group.
+                last = 0
+                for m in [*_RE.finditer(content), None]:
+                    text = content[last:m.start() if m else None].strip()
+                    if text:
                         openai_input.append({
                             "role": "assistant",
-                            "content": [{"type": "output_text", "text": segment["text"].strip()}]
+                            "content": [{"type": "output_text", "text": text}]
                         })
+                    if m:
+                        pending_items.append((len(openai_input), m.group("ulid")))
+                        openai_input.append(None)  # filled once persisted items are fetched
+                        last = m.end()
             else:
                 # Plain assistant text (no encoded IDs detected)
                 if content:
@@ -395,7 +490,21 @@ class ResponsesBody(BaseModel):
                         }
                     )
 
-        return openai_input
+        if not pending_items:
+            return openai_input, instructions
+
+        # Fetch persisted items if both IDs are provided, then fill (or drop) the reserved slots
+        items_lookup: dict[str, dict] = {}
+        if chat_id and openwebui_model_id:
+            items_lookup = fetch_openai_response_items(
+                chat_id,
+                list(dict.fromkeys(ulid for _, ulid in pending_items)),
+                openwebui_model_id=openwebui_model_id,
+            )
+        for slot, ulid in pending_items:
+            openai_input[slot] = items_lookup.get(ulid)
+
+        return [item for item in openai_input if item is not None], instructions
 
     @classmethod
     def from_completions(
@@ -413,26 +522,13 @@ class ResponsesBody(BaseModel):
         completions_dict = completions_body.model_dump(exclude_none=True)
 
         # Step 1: Remove unsupported fields
-        unsupported_fields = {
-            # Fields that are not supported by OpenAI Responses API
-            "frequency_penalty", "presence_penalty", "seed", "logit_bias",
-            "logprobs", "top_logprobs", "n", "stop",
-            "response_format", # Replaced with 'text' in Responses API
-            "suffix", # Responses API does not support suffix
-            "stream_options", # Responses API does not support stream options
-            "audio", # Responses API does not support audio input
-            "function_call", # Deprecated in favor of 'tool_choice'.
-            "functions", # Deprecated in favor of 'tools'.
-
-            # Fields that are dropped and manually handled in step 2.
-            "reasoning_effort", "max_tokens"
+        sanitized_params = {
+            key: value
+            for key, value in completions_dict.items()
+            if key not in UNSUPPORTED_COMPLETIONS_FIELDS
         }
-        sanitized_params = {}
-        for key, value in completions_dict.items():
-            if key in unsupported_fields:
-                logging.warning(f"Dropping unsupported parameter: '{key}'")
-            else:
-                sanitized_params[key] = value
+        for key in completions_dict.keys() & UNSUPPORTED_COMPLETIONS_FIELDS:
+            logging.warning("Dropping unsupported parameter: '%s'", key)
 
         # Step 2: Apply transformations
         # Rename max_tokens → max_output_tokens
@@ -446,19 +542,16 @@ class ResponsesBody(BaseModel):
             reasoning.setdefault("effort", effort)
             sanitized_params["reasoning"] = reasoning
 
-        # Extract the last system message (if any)
-        instructions = next((msg["content"] for msg in reversed(completions_dict.get("messages", [])) if msg["role"] == "system"), None)
-        if instructions:
-            sanitized_params["instructions"] = instructions
-
-        # Transform input messages to OpenAI Responses API format
+        # Transform input messages to OpenAI Responses API format and extract the last system message (if any)
         if "messages" in completions_dict:
             sanitized_params.pop("messages", None)
-            sanitized_params["input"] = ResponsesBody.transform_messages_to_input(
+            sanitized_params["input"], instructions = ResponsesBody._build_input_and_instructions(
                 completions_dict.get("messages", []),
                 chat_id=chat_id,
                 openwebui_model_id=openwebui_model_id
             )
+            if instructions:
+                sanitized_params["instructions"] = instructions
 
         # Build the final ResponsesBody directly
         return ResponsesBody(
@@ -473,6 +566,8 @@ class ResponsesBody(BaseModel):
 class Pipe:
     # 4.1 Configuration Schemas
     class Valves(BaseModel):
+        model_config = ConfigDict(frozen=True)  # Shared by every request (see _merge_valves); overrides go through model_copy
+
         # 1) Connection & Auth
         BASE_URL: str = Field(
             default=((os.getenv("OPENAI_API_BASE_URL") or "").strip() or "https://api.openai.com/v1"),
@@ -597,13 +692,15 @@ class Pipe:
 
         # 10) Logging
         LOG_LEVEL: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = Field(
-            default=os.getenv("GLOBAL_LOG_LEVEL", "INFO").upper(),
+            default=DEFAULT_LOG_LEVEL,
             description="Select logging level.  Recommend INFO or WARNING for production use. DEBUG is useful for development and debugging.",
         )
 
 
     class UserValves(BaseModel):
         """Per-user valve overrides."""
+        model_config = ConfigDict(frozen=True)
+
         LOG_LEVEL: Literal[
             "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL", "INHERIT"
         ] = Field(
@@ -618,10 +715,11 @@ class Pipe:
         self.valves = self.Valves()  # Note: valve values are not accessible in __init__. Access from pipes() or pipe() methods.
         self.session: aiohttp.ClientSession | None = None
         self.logger = SessionLogger.get_logger(__name__)
+        self._native_fc_inflight: dict[str, asyncio.Future[bool]] = {}  # model ID → in-flight DB lookup/update
+        self._native_fc_checked = TTLCache(maxsize=1024, ttl=NATIVE_FUNCTION_CALLING_CACHE_TTL)
 
     async def pipes(self):
-        model_ids = [model_id.strip() for model_id in self.valves.MODEL_ID.split(",") if model_id.strip()]
-        return [{"id": model_id, "name": f"OpenAI: {model_id}"} for model_id in model_ids]
+        return [{"id": model_id, "name": f"OpenAI: {model_id}"} for model_id in parse_model_ids(self.valves.MODEL_ID)]
 
     async def pipe(
         self,
@@ -648,7 +746,7 @@ class Pipe:
 
         # Set up session logger with session_id and log level
         SessionLogger.session_id.set(__metadata__.get("session_id", None))
-        SessionLogger.log_level.set(getattr(logging, valves.LOG_LEVEL.upper(), logging.INFO))
+        SessionLogger.log_level.set(LOG_LEVELS.get(valves.LOG_LEVEL, logging.INFO))
 
         # Transform request body (Completions API -> Responses API).
         completions_body = CompletionsBody.model_validate(body)
@@ -685,15 +783,18 @@ class Pipe:
             )
 
         # Normalize to family-level model name (e.g., 'o3' from 'o3-2025-04-16') to be used for feature detection.
-        model_family = re.sub(r"-\d{4}-\d{2}-\d{2}$", "", responses_body.model)
+        model_family = get_model_family(responses_body.model)
 
         # Resolve __tools__ coroutine returned by newer Open WebUI versions.
         if inspect.isawaitable(__tools__):
             __tools__ = await __tools__
 
+        # Resolve the model's capabilities once; every feature gate below reads this set.
+        supported = model_features(model_family)
+
         # Add Open WebUI Tools (if any) to the ResponsesBody.
         # TODO: Also detect body['tools'] and merge them with __tools__.  This would allow users to pass tools in the request body from filters, etc.
-        if __tools__ and model_family in FEATURE_SUPPORT["function_calling"]:
+        if __tools__ and "function_calling" in supported:
             responses_body.tools = ResponsesBody.transform_tools(
                 tools=__tools__,
                 strict=True,
@@ -702,55 +803,42 @@ class Pipe:
         # Add web_search tool only if supported, enabled, and effort != minimal
         # Noted that web search doesn't seem to work when effort = minimal.
         if (
-            model_family in FEATURE_SUPPORT["web_search_tool"]
+            "web_search_tool" in supported
             and (valves.ENABLE_WEB_SEARCH_TOOL or features.get("web_search", False))
-            and ((responses_body.reasoning or {}).get("effort", "").lower() != "minimal")
+            and not (responses_body.reasoning and str(responses_body.reasoning.get("effort", "")).lower() == "minimal")
         ):
             responses_body.tools = responses_body.tools or []
             responses_body.tools.append({
                 "type": "web_search_preview",
                 "search_context_size": valves.WEB_SEARCH_CONTEXT_SIZE,
-                **({"user_location": json.loads(valves.WEB_SEARCH_USER_LOCATION)} if valves.WEB_SEARCH_USER_LOCATION else {}),
+                **({"user_location": dict(parse_user_location(valves.WEB_SEARCH_USER_LOCATION))} if valves.WEB_SEARCH_USER_LOCATION else {}),
             })
 
         # Append remote MCP servers (experimental)
         if valves.REMOTE_MCP_SERVERS_JSON:
-            mcp_tools = ResponsesBody._build_mcp_tools(valves.REMOTE_MCP_SERVERS_JSON)
+            mcp_tools = build_mcp_tools_cached(valves.REMOTE_MCP_SERVERS_JSON)
             if mcp_tools:
-                responses_body.tools = (responses_body.tools or []) + mcp_tools
+                responses_body.tools = (responses_body.tools or []) + [dict(t) for t in mcp_tools]
 
         # Check if tools are enabled but native function calling is disabled
         # If so, update the OpenWebUI model parameter to enable native function calling for future requests.
-        if __tools__:
-            model = Models.get_model_by_id(openwebui_model_id)
-            if model:
-                params = dict(model.params or {})
-                if params.get("function_calling") != "native":
-                    supports_function_calling = model_family in FEATURE_SUPPORT["function_calling"]
-
-                    if supports_function_calling:
-                        await self._emit_notification(
-                            __event_emitter__,
-                            content=f"Enabling native function calling for model: {openwebui_model_id}. Please re-run your query.",
-                            level="info"
-                        )
-
-                        form_data = model.model_dump()
-                        form_data["params"] = params
-                        form_data["params"]["function_calling"] = "native"
-                        form = ModelForm(**form_data)
-                        Models.update_model_by_id(openwebui_model_id, form)
+        if __tools__ and "function_calling" in supported:
+            if await self._ensure_native_function_calling(openwebui_model_id):
+                await self._emit_notification(
+                    __event_emitter__,
+                    content=f"Enabling native function calling for model: {openwebui_model_id}. Please re-run your query.",
+                    level="info"
+                )
 
-            
         # Enable reasoning summary if enabled and supported
-        if model_family in FEATURE_SUPPORT["reasoning_summary"] and valves.REASONING_SUMMARY != "disabled":
+        if "reasoning_summary" in supported and valves.REASONING_SUMMARY != "disabled":
             # Ensure reasoning param is a mutable dict so we can safely assign to it
             reasoning_params = dict(responses_body.reasoning or {})
             reasoning_params["summary"] = valves.REASONING_SUMMARY
             responses_body.reasoning = reasoning_params
 
         # Always request encrypted reasoning for in-turn carry (multi-tool) unless disabled
-        if (model_family in FEATURE_SUPPORT["reasoning"]
+        if ("reasoning" in supported
             and valves.PERSIST_REASONING_TOKENS != "disabled"
             and responses_body.store is False):
              responses_body.include = responses_body.include or []
@@ -762,16 +850,15 @@ class Pipe:
         if input_items:
             last_item = input_items[-1]
             content_blocks = last_item.get("content") if last_item.get("role") == "user" else None
-            first_block = content_blocks[0] if isinstance(content_blocks, list) and content_blocks else {}
-            last_user_text = (first_block.get("text") or "").strip().lower()
-
-            directive_to_verbosity = {"add details": "high", "more concise": "low"}
-            verbosity_value = directive_to_verbosity.get(last_user_text)
+            first_block = content_blocks[0] if isinstance(content_blocks, list) and content_blocks else None
+            last_user_text = first_block.get("text") if first_block else None
+            verbosity_value = (
+                VERBOSITY_DIRECTIVES.get(last_user_text.strip().lower()) if last_user_text else None
+            )
 
             if verbosity_value:
-                # Check model support
-                model_family = re.sub(r"-\d{4}-\d{2}-\d{2}$", "", responses_body.model)
-                if model_family in FEATURE_SUPPORT["verbosity"]:
+                # Check model support (model_family is still current; the model is not changed after routing)
+                if "verbosity" in supported:
                     # Set/overwrite verbosity (do NOT remove the stub message)
                     current_text_params = dict(getattr(responses_body, "text", {}) or {})
                     current_text_params["verbosity"] = verbosity_value
@@ -785,8 +872,12 @@ class Pipe:
 
                     self.logger.debug("Set text.verbosity=%s based on regenerate directive '%s'",verbosity_value, last_user_text)
 
-        # Log the transformed request body
-        self.logger.debug("Transformed ResponsesBody: %s", json.dumps(responses_body.model_dump(exclude_none=True), indent=2, ensure_ascii=False))
+        # Log the transformed request body (serialized only if the record passes the session log level).
+        # The body is bound as a default so the lambda does not turn ``responses_body`` into a closure cell.
+        self.logger.debug(
+            "Transformed ResponsesBody: %s",
+            LazyStr(lambda b=responses_body: _json_dumps_debug(b.model_dump(exclude_none=True))),
+        )
             
         # Send to OpenAI Responses API
         if responses_body.stream:
@@ -810,18 +901,22 @@ class Pipe:
         """
         tools = tools or {}
         openwebui_model = metadata.get("model", {}).get("id", "")
+        if event_emitter:
+            # Every delta re-sends the whole message; collapse bursts into one UI update.
+            event_emitter = ChatMessageCoalescer(event_emitter)
         assistant_message = ""
         total_usage: dict[str, Any] = {}
         ordinal_by_url: dict[str, int] = {}
         emitted_citations: list[dict] = []
+        date_accessed = datetime.date.today().isoformat()  # shared by every citation of this response
 
         status_indicator = ExpandableStatusIndicator(event_emitter) # Custom class for simplifying the <details> expandable status updates
         status_indicator._done = False
 
         # Emit initial "thinking" block:
         # If reasoning model, write "Thinking…" to the expandable status emitter.
-        model_family = re.sub(r"-\d{4}-\d{2}-\d{2}$", "", body.model)
-        if model_family in FEATURE_SUPPORT["reasoning"]:
+        model_family = get_model_family(body.model)
+        if "reasoning" in model_features(model_family):
             assistant_message = await status_indicator.add(
                 assistant_message,
                 status_title="Thinking…",
@@ -829,217 +924,200 @@ class Pipe:
             )
 
         # Send OpenAI Responses API request, parse and emit response
+        # Only ``input`` grows between turns, so dump the rest of the body once and
+        # point the payload at one live input list that every turn extends.
+        input_items = self._input_as_list(body)
+        request_body = body.model_dump(exclude={"input"}, exclude_none=True)
+        request_body["input"] = input_items
+
+        # The logger is pinned at DEBUG and filtered by the session level, so resolve once
+        # whether per-event DEBUG records would be kept instead of building them per event.
+        log_events = SessionLogger.log_level.get() <= logging.DEBUG
+
         try:
             for loop_idx in range(valves.MAX_FUNCTION_CALL_LOOPS):
                 final_response: dict[str, Any] | None = None
-                async for event in self.send_openai_responses_streaming_request(
-                    body.model_dump(exclude_none=True),
-                    api_key=valves.API_KEY,
-                    base_url=valves.BASE_URL,
-                ):
-                    etype = event.get("type")
-
-                    # Efficient check if debug logging is enabled. If so, log the event name
-                    if self.logger.isEnabledFor(logging.DEBUG):
-                        self.logger.debug("Received event: %s", etype)
-                        # if doesn't end in .delta, log the full event
-                        if not etype.endswith(".delta"):
-                            self.logger.debug("Event data: %s", json.dumps(event, indent=2, ensure_ascii=False))
-
-                    # ─── Emit partial delta assistant message
-                    if etype == "response.output_text.delta":
-                        delta = event.get("delta", "")
-                        if delta:
-                            assistant_message += delta
-                            await event_emitter({"type": "chat:message",
-                                                 "data": {"content": assistant_message}})
-                        continue
-
-                    # ─── Reasoning summary -> status indicator (done only) ───────────────────────
-                    if etype == "response.reasoning_summary_text.done":
-                        text = (event.get("text") or "").strip()
-                        if text:
-                            # Use last bolded header as the title, else fallback
-                            title_match = re.findall(r"\*\*(.+?)\*\*", text)
-                            title = title_match[-1].strip() if title_match else "Thinking…"
-
-                            # Remove bold markers from body
-                            content = re.sub(r"\*\*(.+?)\*\*", "", text).strip()
-
-                            assistant_message = await status_indicator.add(
-                                assistant_message,
-                                status_title=f"🧠 {title}",
-                                status_content=content,
-                            )
-                        continue
-
-                    # ─── Emit annotation
-                    if etype == "response.output_text.annotation.added":
-                        ann = event["annotation"]
-                        url = ann.get("url", "").removesuffix("?utm_source=openai")
-                        title = ann.get("title", "").strip()
-                        domain = urlparse(url).netloc.lower().lstrip('www.')
-
-                        # Have we already cited this URL?
-                        already_cited = url in ordinal_by_url
-
-                        if already_cited:
-                            # Reuse the original citation number
-                            citation_number = ordinal_by_url[url]
-                        else:
-                            # Assign next available number to this new citation URL
-                            citation_number = len(ordinal_by_url) + 1
-                            ordinal_by_url[url] = citation_number
-
-                            # Emit the citation event now, because it's new
-                            citation_payload = {
-                                "source": {"name": domain, "url": url},
-                                "document": [title],  # or snippet if you have it
-                                "metadata": [{
-                                    "source": url,
-                                    "date_accessed": datetime.date.today().isoformat(),
-                                }],
-                            }
-                            await event_emitter({"type": "source", "data": citation_payload})
-                            emitted_citations.append(citation_payload)
-
-                        # Insert the citation marker into the message text
-                        assistant_message += f" [{citation_number}]"
-
-                        # Remove the markdown link originally printed by the model
-                        assistant_message = re.sub(
-                            rf"\(\s*\[\s*{re.escape(domain)}\s*\]\([^)]+\)\s*\)",
-                            " ",
-                            assistant_message,
-                            count=1,
-                        ).strip()
+                # Read the SSE stream in a background task so the socket keeps draining
+                # while events are emitted to the UI / persisted below.  ``aclosing`` stops the
+                # reader and closes the HTTP response as soon as the loop breaks or fails.
+                async with contextlib.aclosing(prefetch(
+                    self.send_openai_responses_streaming_request(
+                        request_body,
+                        api_key=valves.API_KEY,
+                        base_url=valves.BASE_URL,
+                    ),
+                    STREAM_PREFETCH_EVENTS,
+                )) as events:
+                    async for event in events:
+                        etype = event.get("type")
+
+                        # If DEBUG logging is enabled for this session, log the event name
+                        if log_events:
+                            self.logger.debug("Received event: %s", etype)
+                            # if doesn't end in .delta, log the full event
+                            if not etype.endswith(".delta"):
+                                # Bind ``event`` as a default: a closure would make it a cell read on every iteration.
+                                self.logger.debug("Event data: %s", LazyStr(lambda e=event: _json_dumps_debug(e, indent=False)))
+
+                        # ─── Emit partial delta assistant message
+                        if etype == "response.output_text.delta":
+                            delta = event.get("delta", "")
+                            if delta:
+                                assistant_message += delta
+                                await event_emitter({"type": "chat:message",
+                                                     "data": {"content": assistant_message}})
+                            continue
 
-                        # Send updated assistant message chunk to UI
-                        await event_emitter({
-                            "type": "chat:message",
-                            "data": {"content": assistant_message},
-                        })
-                        continue
+                        # Skip the many event types handled by none of the branches below in one lookup
+                        if etype not in STREAM_HANDLED_EVENTS:
+                            continue
 
-                    # ─── Emit status updates for in-progress items ──────────────────────
-                    if etype == "response.output_item.added":
-                        item = event.get("item", {})
-                        item_type = item.get("type", "")
-                        item_status = item.get("status", "")
+                        # ─── Reasoning summary -> status indicator (done only) ───────────────────────
+                        if etype == "response.reasoning_summary_text.done":
+                            text = (event.get("text") or "").strip()
+                            if text:
+                                # Use last bolded header as the title, else fallback
+                                title_match = BOLD_RE.findall(text) if "**" in text else None
+                                title = title_match[-1].strip() if title_match else "Thinking…"
+
+                                # Remove bold markers from body
+                                content = BOLD_RE.sub("", text).strip() if title_match else text
+
+                                assistant_message = await status_indicator.add(
+                                    assistant_message,
+                                    status_title=f"🧠 {title}",
+                                    status_content=content,
+                                )
+                            continue
 
-                        # If type is message and status is in_progress, emit a status update
-                        if item_type == "message" and item_status == "in_progress" and len(status_indicator._items) > 0:
-                            # Emit a status update for the message
-                            assistant_message = await status_indicator.add(
+                        # ─── Emit annotation
+                        if etype == "response.output_text.annotation.added":
+                            ann = event["annotation"]
+                            url = ann.get("url", "").removesuffix("?utm_source=openai")
+                            title = ann.get("title", "").strip()
+                            domain = url_domain(url)
+
+                            # Have we already cited this URL?
+                            already_cited = url in ordinal_by_url
+
+                            if already_cited:
+                                # Reuse the original citation number
+                                citation_number = ordinal_by_url[url]
+                            else:
+                                # Assign next available number to this new citation URL
+                                citation_number = len(ordinal_by_url) + 1
+                                ordinal_by_url[url] = citation_number
+
+                                # Emit the citation event now, because it's new
+                                citation_payload = {
+                                    "source": {"name": domain, "url": url},
+                                    "document": [title],  # or snippet if you have it
+                                    "metadata": [{
+                                        "source": url,
+                                        "date_accessed": date_accessed,
+                                    }],
+                                }
+                                await event_emitter({"type": "source", "data": citation_payload})
+                                emitted_citations.append(citation_payload)
+
+                            # Insert the citation marker into the message text
+                            assistant_message += f" [{citation_number}]"
+
+                            # Remove the markdown link originally printed by the model
+                            assistant_message = re.sub(
+                                rf"\(\s*\[\s*{re.escape(domain)}\s*\]\([^)]+\)\s*\)",
+                                " ",
                                 assistant_message,
-                                status_title="📝 Responding to the user…",
-                                status_content="",
-                            )
+                                count=1,
+                            ).strip()
+
+                            # Send updated assistant message chunk to UI
+                            await event_emitter({
+                                "type": "chat:message",
+                                "data": {"content": assistant_message},
+                            })
                             continue
 
-                    # ─── Emit detailed tool status upon completion ────────────────────────
-                    if etype == "response.output_item.done":
-                        item = event.get("item", {})
-                        item_type = item.get("type", "")
-                        item_name = item.get("name", "unnamed_tool")
+                        # ─── Emit status updates for in-progress items ──────────────────────
+                        if etype == "response.output_item.added":
+                            item = event.get("item") or {}
+                            item_type = item.get("type", "")
+                            item_status = item.get("status", "")
+
+                            # If type is message and status is in_progress, emit a status update
+                            if item_type == "message" and item_status == "in_progress" and len(status_indicator._items) > 0:
+                                # Emit a status update for the message
+                                assistant_message = await status_indicator.add(
+                                    assistant_message,
+                                    status_title="📝 Responding to the user…",
+                                    status_content="",
+                                )
+                                continue
+
+                        # ─── Emit detailed tool status upon completion ────────────────────────
+                        if etype == "response.output_item.done":
+                            item = event.get("item") or {}
+                            item_type = item.get("type", "")
+
+                            # Skip irrelevant item types
+                            if item_type in ("message"):
+                                continue
+
+                            # Persist all non-message items.
+                            # If it's a reasoning item, only persist when PERSIST_REASONING_TOKENS is chat
+                            should_persist = False
+                            if item_type == "reasoning":
+                                should_persist = (valves.PERSIST_REASONING_TOKENS == "conversation") # Only persist reasoning when explicitly allowed for this turn
+                            elif item_type != "message":
+                                should_persist = valves.PERSIST_TOOL_RESULTS # Persist all other non-message items (tool calls, web_search_call, etc.)
+
+                            if should_persist:
+                                hidden_uid_marker = persist_openai_response_items(
+                                    metadata.get("chat_id"),
+                                    metadata.get("message_id"),
+                                    [item],
+                                    openwebui_model,
+                                )
+                                if hidden_uid_marker:
+                                    self.logger.debug("Persisted item: %s", hidden_uid_marker)
+                                    assistant_message += hidden_uid_marker
+                                    await event_emitter({"type": "chat:message", "data": {"content": assistant_message}})
+
+
+                            # Prepare a status title and detailed content per item_type
+                            title, content = describe_output_item(item)
+
+                            # Emit the status with prepared title and detailed content
+                            if title:
+                                assistant_message = await status_indicator.add(
+                                    assistant_message,
+                                    status_title=title,
+                                    status_content=content,
+                                )
 
-                        # Skip irrelevant item types
-                        if item_type in ("message"):
                             continue
 
-                        # Persist all non-message items.
-                        # If it's a reasoning item, only persist when PERSIST_REASONING_TOKENS is chat
-                        should_persist = False
-                        if item_type == "reasoning":
-                            should_persist = (valves.PERSIST_REASONING_TOKENS == "conversation") # Only persist reasoning when explicitly allowed for this turn
-                        elif item_type != "message":
-                            should_persist = valves.PERSIST_TOOL_RESULTS # Persist all other non-message items (tool calls, web_search_call, etc.)
-
-                        if should_persist:
-                            hidden_uid_marker = persist_openai_response_items(
-                                metadata.get("chat_id"),
-                                metadata.get("message_id"),
-                                [item],
-                                openwebui_model,
-                            )
-                            if hidden_uid_marker:
-                                self.logger.debug("Persisted item: %s", hidden_uid_marker)
-                                assistant_message += hidden_uid_marker
-                                await event_emitter({"type": "chat:message", "data": {"content": assistant_message}})
-
-
-                        # Default empty content
-                        title = f"Running `{item_name}`"
-                        content = ""
-
-                        # Prepare detailed content per item_type
-                        if item_type == "function_call":
-                            title = f"🛠️ Running the {item_name} tool…"
-                            arguments = json.loads(item.get("arguments") or "{}")
-                            args_formatted = ", ".join(f"{k}={json.dumps(v)}" for k, v in arguments.items())
-                            content = wrap_code_block(f"{item_name}({args_formatted})", "python")
-
-                        elif item_type == "web_search_call":
-                            title = "🔍 Hmm, let me quickly check online…"
-
-                            # If action type is 'search', then set title to "🔍 Searching the web for [query]"
-                            action = item.get("action", {})
-                            if action.get("type") == "search":
-                                query = action.get("query")
-                                if query:
-                                    title = f"🔍 Searching the web for: `{query}`"
-                                else:
-                                    title = "🔍 Searching the web"
-
-                            # If action type is 'open_page', then set title to "🔍 Opening web page [url]"
-                            elif action.get("type") == "open_page":
-                                title = "🔍 Opening web page…"
-                                url = action.get("url")
-                                if url:
-                                    content = f"URL: `{url}`"
-
-                        elif item_type == "file_search_call":
-                            title = "📂 Let me skim those files…"
-                        elif item_type == "image_generation_call":
-                            title = "🎨 Let me create that image…"
-                        elif item_type == "local_shell_call":
-                            title = "💻 Let me run that command…"
-                        elif item_type == "mcp_call":
-                            title = "🌐 Let me query the MCP server…"
-                        elif item_type == "reasoning":
-                            title = None # Don't emit a title for reasoning items
-
-                        # Emit the status with prepared title and detailed content
-                        if title:
-                            assistant_message = await status_indicator.add(
-                                assistant_message,
-                                status_title=title,
-                                status_content=content,
-                            )
-
-                        continue
-
-                    # ─── Capture final response (incl. all non-visible items like reasoning tokens for future turns)
-                    if etype == "response.completed":
-                        final_response = event.get("response", {})
-                        body.input.extend(final_response.get("output", [])) # This includes all non-visible items (e.g. reasoning, web_search_call, tool calls, etc..) and appends to body.input so they are included in future turns (if any)
-                        break
+                        # ─── Capture final response (incl. all non-visible items like reasoning tokens for future turns)
+                        if etype == "response.completed":
+                            final_response = event.get("response", {})
+                            input_items.extend(final_response.get("output", [])) # This includes all non-visible items (e.g. reasoning, web_search_call, tool calls, etc..) and appends to body.input so they are included in future turns (if any)
+                            break
 
                 if final_response is None:
                     raise ValueError("No final response received from OpenAI Responses API.")
 
+                # Function calls are collected once and reused for usage stats and execution.
+                calls = [i for i in final_response["output"] if i["type"] == "function_call"]
+
                 # Extract usage information from OpenAI response and pass-through to Open WebUI
                 usage = final_response.get("usage", {})
                 if usage:
                     usage["turn_count"] = 1
-                    usage["function_call_count"] = sum(
-                        1 for i in final_response["output"] if i["type"] == "function_call"
-                    )
+                    usage["function_call_count"] = len(calls)
                     total_usage = merge_usage_stats(total_usage, usage)
                     await self._emit_completion(event_emitter, content="", usage=total_usage, done=False)
 
                 # Execute tool calls (if any), persist results (if valve enabled), and append to body.input.
-                calls = [i for i in final_response["output"] if i["type"] == "function_call"]
                 if calls:
                     function_outputs = await self._execute_function_calls(calls, tools)
                     if valves.PERSIST_TOOL_RESULTS:
@@ -1055,15 +1133,17 @@ class Pipe:
                             await event_emitter({"type": "chat:message", "data": {"content": assistant_message}})
 
 
-                    # Add status indicator with sanitized result
-                    for output in function_outputs:
+                    # Add status indicator with sanitized result (pushed to the UI once, after the last)
+                    last = len(function_outputs) - 1
+                    for i, output in enumerate(function_outputs):
                         result_text = wrap_code_block(output.get("output", ""))
                         assistant_message = await status_indicator.add(
                             assistant_message,
                             status_title="🛠️ Received tool result",
                             status_content=result_text,
+                            emit=i == last,
                         )
-                    body.input.extend(function_outputs)
+                    input_items.extend(function_outputs)
                 else:
                     break
 
@@ -1077,24 +1157,32 @@ class Pipe:
 
             if valves.LOG_LEVEL != "INHERIT":
                 if event_emitter:
-                    session_id = SessionLogger.session_id.get()
-                    logs = SessionLogger.logs.get(session_id, [])
+                    logs = SessionLogger.format_logs(SessionLogger.session_id.get())
                     if logs:
-                        await self._emit_citation(event_emitter, "\n".join(logs), "Logs")
+                        await self._emit_citation(event_emitter, logs, "Logs")
 
             # Emit completion (middleware.py also does this so this just covers if there is a downstream error)
-            await self._emit_completion(event_emitter, content="", usage=total_usage, done=True)  # There must be an empty content to avoid breaking the UI
-
-            # Clear logs
-            logs_by_msg_id.clear()
-            SessionLogger.logs.pop(SessionLogger.session_id.get(), None)
+            # Being a non chat:message event, this also flushes any coalesced update.
+            completion = self._emit_completion(event_emitter, content="", usage=total_usage, done=True)  # There must be an empty content to avoid breaking the UI
 
+            # Persist citations off the event loop while the final frame is sent.
             chat_id = metadata.get("chat_id")
             message_id = metadata.get("message_id")
-            if chat_id and message_id and emitted_citations:
-                Chats.upsert_message_to_chat_by_id_and_message_id(
-                    chat_id, message_id, {"sources": emitted_citations}
-                )
+            try:
+                if chat_id and message_id and emitted_citations:
+                    await asyncio.gather(
+                        completion,
+                        asyncio.to_thread(
+                            Chats.upsert_message_to_chat_by_id_and_message_id,
+                            chat_id, message_id, {"sources": emitted_citations},
+                        ),
+                    )
+                else:
+                    await completion
+            finally:
+                # Clear logs (even if persisting the citations failed)
+                logs_by_msg_id.clear()
+                SessionLogger.logs.pop(SessionLogger.session_id.get(), None)
 
             # Return the final output to ensure persistence.
             return assistant_message
@@ -1125,8 +1213,8 @@ class Pipe:
         status_indicator = ExpandableStatusIndicator(event_emitter)
         status_indicator._done = False
 
-        model_family = re.sub(r"-\d{4}-\d{2}-\d{2}$", "", body.model)
-        if model_family in FEATURE_SUPPORT["reasoning"]:
+        model_family = get_model_family(body.model)
+        if "reasoning" in model_features(model_family):
             assistant_message = await status_indicator.add(
                 assistant_message,
                 status_title="Thinking…",
@@ -1135,10 +1223,16 @@ class Pipe:
                 ),
             )
 
+        # Only ``input`` grows between turns, so dump the rest of the body once and
+        # point the payload at one live input list that every turn extends.
+        input_items = self._input_as_list(body)
+        request_body = body.model_dump(exclude={"input"}, exclude_none=True)
+        request_body["input"] = input_items
+
         try:
             for loop_idx in range(valves.MAX_FUNCTION_CALL_LOOPS):
                 response = await self.send_openai_responses_nonstreaming_request(
-                    body.model_dump(exclude_none=True),
+                    request_body,
                     api_key=valves.API_KEY,
                     base_url=valves.BASE_URL,
                 )
@@ -1150,18 +1244,16 @@ class Pipe:
                     item_type = item.get("type")
 
                     if item_type == "message":
-                        for content in item.get("content", []):
-                            if content.get("type") == "output_text":
-                                assistant_message += content.get("text", "")
+                        assistant_message += "".join(iter_output_text((item,)))
 
                     elif item_type == "reasoning_summary_text":
                         idx = item.get("summary_index", 0)
                         text = item.get("text", "")
                         if text:
                             reasoning_map[idx] = reasoning_map.get(idx, "") + text
-                            title_match = re.findall(r"\*\*(.+?)\*\*", text)
+                            title_match = BOLD_RE.findall(text) if "**" in text else None
                             title = title_match[-1].strip() if title_match else "Thinking…"
-                            content = re.sub(r"\*\*(.+?)\*\*", "", text).strip()
+                            content = BOLD_RE.sub("", text).strip() if title_match else text.strip()
                             assistant_message = await status_indicator.add(
                                 assistant_message,
                                 status_title="🧠 " + title,
@@ -1170,7 +1262,7 @@ class Pipe:
 
                     elif item_type == "reasoning":
                         parts = "\n\n---".join(
-                            reasoning_map[i] for i in sorted(reasoning_map)
+                            text for _, text in sorted(reasoning_map.items())
                         )
                         snippet = (
                             f'<details type="{__name__}.reasoning" done="true">\n'
@@ -1190,40 +1282,7 @@ class Pipe:
                             self.logger.debug("Persisted item: %s", hidden_uid_marker)
                             assistant_message += hidden_uid_marker
 
-                        title = f"Running `{item.get('name', 'unnamed_tool')}`"
-                        content = ""
-
-                        if item_type == "function_call":
-                            title = f"🛠️ Running the {item.get('name', 'unnamed_tool')} tool…"
-                            arguments = json.loads(item.get("arguments") or "{}")
-                            args_formatted = ", ".join(
-                                f"{k}={json.dumps(v)}" for k, v in arguments.items()
-                            )
-                            content = wrap_code_block(f"{item.get('name', 'unnamed_tool')}({args_formatted})", "python")
-                        elif item_type == "web_search_call":
-                            title = "🔍 Hmm, let me quickly check online…"
-                            action = item.get("action", {})
-                            if action.get("type") == "search":
-                                query = action.get("query")
-                                if query:
-                                    title = f"🔍 Searching the web for: `{query}`"
-                                else:
-                                    title = "🔍 Searching the web"
-                            elif action.get("type") == "open_page":
-                                title = "🔍 Opening web page…"
-                                url = action.get("url")
-                                if url:
-                                    content = f"URL: `{url}`"
-                        elif item_type == "file_search_call":
-                            title = "📂 Let me skim those files…"
-                        elif item_type == "image_generation_call":
-                            title = "🎨 Let me create that image…"
-                        elif item_type == "local_shell_call":
-                            title = "💻 Let me run that command…"
-                        elif item_type == "mcp_call":
-                            title = "🌐 Let me query the MCP server…"
-                        elif item_type == "reasoning":
-                            title = None
+                        title, content = describe_output_item(item)
 
                         if title:
                             assistant_message = await status_indicator.add(
@@ -1232,19 +1291,18 @@ class Pipe:
                                 status_content=content,
                             )
 
+                calls = [i for i in items if i.get("type") == "function_call"]
+
                 usage = response.get("usage", {})
                 if usage:
                     usage["turn_count"] = 1
-                    usage["function_call_count"] = sum(
-                        1 for i in items if i.get("type") == "function_call"
-                    )
+                    usage["function_call_count"] = len(calls)
                     total_usage = merge_usage_stats(total_usage, usage)
                     await self._emit_completion(event_emitter, content="", usage=total_usage, done=False)
 
-                body.input.extend(items)
+                input_items.extend(items)
 
                 # Run tools if requested
-                calls = [i for i in items if i.get("type") == "function_call"]
                 if calls:
                     function_outputs = await self._execute_function_calls(calls, tools)
                     if valves.PERSIST_TOOL_RESULTS:
@@ -1257,15 +1315,17 @@ class Pipe:
                         self.logger.debug("Persisted item: %s", hidden_uid_marker)
                         assistant_message += hidden_uid_marker
 
-                    # Add status indicator with sanitized result
-                    for output in function_outputs:
+                    # Add status indicator with sanitized result (pushed to the UI once, after the last)
+                    last = len(function_outputs) - 1
+                    for i, output in enumerate(function_outputs):
                         result_text = wrap_code_block(output.get("output", ""))
                         assistant_message = await status_indicator.add(
                             assistant_message,
                             status_title="🛠️ Received tool result",
                             status_content=result_text,
+                            emit=i == last,
                         )
-                    body.input.extend(function_outputs)
+                    input_items.extend(function_outputs)
                 else:
                     break
 
@@ -1316,17 +1376,7 @@ class Pipe:
             base_url=valves.BASE_URL,
         )
 
-        text_parts: list[str] = []
-        for item in response.get("output", []):
-            if item.get("type") != "message":
-                continue
-            for content in item.get("content", []):
-                if content.get("type") == "output_text":
-                    text_parts.append(content.get("text", ""))
-
-        message = "".join(text_parts)
-
-        return message
+        return "".join(iter_output_text(response.get("output", [])))
       
     # 4.5 LLM HTTP Request Helpers
     async def send_openai_responses_streaming_request(
@@ -1350,37 +1400,54 @@ class Pipe:
             "Accept": "text/event-stream",
         }
         url = base_url.rstrip("/") + "/responses"
+        data = _encode_request_body(request_body)
 
         buf = bytearray()
-        async with self.session.post(url, json=request_body, headers=headers) as resp:
+        offset = 0  # start of the first unprocessed line in ``buf``
+        async with self.session.post(url, data=data, headers=headers) as resp:
             resp.raise_for_status()
 
             async for chunk in resp.content.iter_chunked(4096):
                 buf.extend(chunk)
-                start_idx = 0
-                # Process all complete lines in the buffer
+                # Process all complete lines in the buffer using index arithmetic,
+                # so only `data:` payloads are ever copied out of ``buf``.
                 while True:
-                    newline_idx = buf.find(b"\n", start_idx)
-                    if newline_idx == -1:
+                    end = buf.find(b"\n", offset)
+                    if end == -1:
                         break
-                    
-                    line = buf[start_idx:newline_idx].strip()
-                    start_idx = newline_idx + 1
+                    start, offset = offset, end + 1
 
                     # Skip empty lines, comment lines, or anything not starting with "data:"
-                    if (not line or line.startswith(b":") or not line.startswith(b"data:")):
+                    while start < end and buf[start] in b" \t\r":
+                        start += 1
+                    if not buf.startswith(b"data:", start, end):
                         continue
+                    start += 5
+                    while start < end and buf[start] in b" \t\r":
+                        start += 1
+                    while end > start and buf[end - 1] in b" \t\r":
+                        end -= 1
 
-                    data_part = line[5:].strip()
-                    if data_part == b"[DONE]":
+                    if buf.startswith(b"[DONE]", start, end) and end - start == 6:
                         return  # End of SSE stream
-                    
-                    # Yield JSON-decoded data
-                    yield json.loads(data_part.decode("utf-8"))
 
-                # Remove processed data from the buffer
-                if start_idx > 0:
-                    del buf[:start_idx]
+                    # Yield JSON-decoded data (both codecs accept UTF-8 bytes directly)
+                    payload = buf[start:end]
+                    try:
+                        event = _json_loads(payload)
+                    except ValueError:
+                        if orjson is None:
+                            raise
+                        event = json.loads(payload)  # orjson rejects lone-surrogate escapes; json accepts them
+                    yield event
+
+                # Drop processed bytes lazily; shifting the tail after every chunk is O(n).
+                if offset == len(buf):
+                    buf.clear()
+                    offset = 0
+                elif offset > 65536:
+                    del buf[:offset]
+                    offset = 0
 
     async def send_openai_responses_nonstreaming_request(
         self,
@@ -1397,21 +1464,26 @@ class Pipe:
             "Content-Type": "application/json",
         }
         url = base_url.rstrip("/") + "/responses"
+        data = _encode_request_body(request_params)
 
-        async with self.session.post(url, json=request_params, headers=headers) as resp:
+        async with self.session.post(url, data=data, headers=headers) as resp:
             resp.raise_for_status()
             return await resp.json()
     
     async def _get_or_init_http_session(self) -> aiohttp.ClientSession:
-        """Return a cached ``aiohttp.ClientSession`` instance.
+        """Return the module-wide ``aiohttp.ClientSession``.
 
         The session is created with connection pooling and sensible timeouts on
-        first use and is then reused for the lifetime of the process.
+        first use and is then shared by every ``Pipe`` instance for the lifetime
+        of the process, so keep-alive connections, the DNS cache and TLS sessions
+        are reused across requests instead of being re-established per instance.
         """
+        global _HTTP_SESSION
+
         # Reuse existing session if available and open
-        if self.session is not None and not self.session.closed:
+        if _HTTP_SESSION is not None and not _HTTP_SESSION.closed:
             self.logger.debug("Reusing existing aiohttp.ClientSession")
-            return self.session
+            return _HTTP_SESSION
 
         self.logger.debug("Creating new aiohttp.ClientSession")
 
@@ -1430,13 +1502,24 @@ class Pipe:
             sock_read=3600,  # Max seconds for reading from socket (1 hour)
         )
 
-        session = aiohttp.ClientSession(
+        _HTTP_SESSION = aiohttp.ClientSession(
             connector=connector,
             timeout=timeout,
             json_serialize=json.dumps,
         )
 
-        return session
+        return _HTTP_SESSION
+
+    @staticmethod
+    def _input_as_list(body: ResponsesBody) -> list[dict[str, Any]]:
+        """Return ``body.input`` as a list, wrapping plain-text input in a user message once.
+
+        The loops extend the returned list in place with each turn's output and
+        tool results, so it must stay the same object as ``body.input``.
+        """
+        if not isinstance(body.input, list):
+            body.input = [{"role": "user", "content": body.input}]
+        return body.input
     
     # 4.6 Tool Execution Logic
     @staticmethod
@@ -1447,8 +1530,10 @@ class Pipe:
         """Execute one or more tool calls and return their outputs.
 
         Each call specification is looked up in the ``tools`` mapping by name
-        and executed concurrently.  The returned list contains synthetic
-        ``function_call_output`` items suitable for feeding back into the LLM.
+        and executed concurrently (at most ``TOOL_CALL_CONCURRENCY`` at once).
+        If one call raises, the others are cancelled and its error propagates.
+        The returned list contains synthetic ``function_call_output`` items
+        suitable for feeding back into the LLM.
         """
         def _make_task(call):
             tool_cfg = tools.get(call["name"])
@@ -1456,15 +1541,29 @@ class Pipe:
                 return asyncio.sleep(0, result="Tool not found")
 
             fn = tool_cfg["callable"]
-            args = json.loads(call["arguments"])
+            args = json.loads(call["arguments"])             # stdlib keeps ints beyond 64 bits exact
 
             if inspect.iscoroutinefunction(fn):              # async tool
                 return fn(**args)
             else:                                            # sync tool
                 return asyncio.to_thread(fn, **args)
 
-        tasks   = [_make_task(call) for call in calls]       # ← fire & forget
-        results = await asyncio.gather(*tasks)               # ← runs in parallel. TODO: asyncio.gather(*tasks) cancels all tasks if one tool raises.
+        if len(calls) == 1:                                  # common case: no task group needed
+            results = [await _make_task(calls[0])]
+        else:
+            # Bounded so a burst of sync tools cannot occupy the whole default thread pool.
+            limit = asyncio.Semaphore(TOOL_CALL_CONCURRENCY)
+
+            async def _bounded(call):
+                async with limit:
+                    return await _make_task(call)
+
+            try:
+                async with asyncio.TaskGroup() as tg:        # cancels the rest if one tool raises
+                    tasks = [tg.create_task(_bounded(call)) for call in calls]
+            except BaseExceptionGroup as eg:
+                raise eg.exceptions[0] from None             # surface the tool's own error, as gather did
+            results = [task.result() for task in tasks]
 
         return [
             {
@@ -1508,11 +1607,11 @@ class Pipe:
             # 2) Optionally emit the citation with logs
             if show_error_log_citation:
                 session_id = SessionLogger.session_id.get()
-                logs = SessionLogger.logs.get(session_id, [])
+                logs = SessionLogger.format_logs(session_id)
                 if logs:
                     await self._emit_citation(
                         event_emitter,
-                        "\n".join(logs),
+                        logs,
                         "Error Logs",
                     )
                 else:
@@ -1575,17 +1674,12 @@ class Pipe:
             return
 
         # Note: Open WebUI emits a final "chat:completion" event after the stream ends, which overwrites any previously emitted completion events' content and title in the UI.
-        await event_emitter(
-            {
-                "type": "chat:completion",
-                "data": {
-                    "done": done,
-                    "content": content,
-                    **({"title": title} if title is not None else {}),
-                    **({"usage": usage} if usage is not None else {}),
-                }
-            }
-        )
+        data: dict[str, Any] = {"done": done, "content": content}
+        if title is not None:
+            data["title"] = title
+        if usage is not None:
+            data["usage"] = usage
+        await event_emitter({"type": "chat:completion", "data": data})
 
     async def _emit_status(
         self,
@@ -1646,6 +1740,32 @@ class Pipe:
         """
         return "gpt-5-chat-latest"
 
+    async def _ensure_native_function_calling(self, openwebui_model_id: str) -> bool:
+        """Enable native function calling on the Open WebUI model, off the event loop.
+
+        The blocking ``Models`` lookup/update runs in a worker thread.  Concurrent
+        requests for the same model share a single in-flight lookup, so a burst of
+        chats only hits the database once.  Models already checked are remembered for
+        ``NATIVE_FUNCTION_CALLING_CACHE_TTL`` seconds.  Returns ``True`` if the model was updated.
+        """
+        if self._native_fc_checked.get(openwebui_model_id):
+            return False
+
+        inflight = self._native_fc_inflight.get(openwebui_model_id)
+        if inflight is None:
+            inflight = asyncio.ensure_future(
+                asyncio.to_thread(enable_native_function_calling, openwebui_model_id)
+            )
+            self._native_fc_inflight[openwebui_model_id] = inflight
+            inflight.add_done_callback(
+                lambda _: self._native_fc_inflight.pop(openwebui_model_id, None)
+            )
+
+        # Shield so a cancelled request doesn't cancel the lookup other requests are awaiting.
+        updated = await asyncio.shield(inflight)
+        self._native_fc_checked.set(openwebui_model_id, True)
+        return updated
+
     # 4.8 Internal Static Helpers
     def _merge_valves(self, global_valves, user_valves) -> "Pipe.Valves":
         """Merge user-level valves into the global defaults.
@@ -1656,13 +1776,15 @@ class Pipe:
         if not user_valves:
             return global_valves
 
-        # Merge: update only fields not set to "INHERIT"
+        # Merge: update only fields not set to "INHERIT".  Read the declared fields
+        # directly instead of dumping the model, and skip the copy when nothing overrides.
         update = {
             k: v
-            for k, v in user_valves.model_dump().items()
-            if v is not None and str(v).lower() != "inherit"
+            for k in type(user_valves).model_fields
+            if (v := getattr(user_valves, k)) is not None
+            and not (isinstance(v, str) and v.lower() == "inherit")  # only str valves can INHERIT
         }
-        return global_valves.model_copy(update=update)
+        return global_valves.model_copy(update=update) if update else global_valves
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 5. Utility Classes (Shared utilities)
@@ -1675,7 +1797,23 @@ current_session_id: ContextVar[str | None] = ContextVar("current_session_id", de
 class SessionLogger:
     session_id = ContextVar("session_id", default=None)
     log_level = ContextVar("log_level", default=logging.INFO)
-    logs = defaultdict(lambda: deque(maxlen=2000))
+    logs = defaultdict(lambda: deque(maxlen=2000))  # session_id -> LogRecords (formatted on read)
+    _log_formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+
+    @classmethod
+    def format_logs(cls, session_id) -> str:
+        """Return the buffered records for ``session_id`` as newline-joined text ("" if none)."""
+        records = cls.logs.get(session_id)
+        if not records:
+            return ""
+        return "\n".join(map(cls._format_record, records))
+
+    @classmethod
+    def _format_record(cls, record: logging.LogRecord) -> str:
+        try:
+            return cls._log_formatter.format(record)
+        except Exception:  # the record's message could not be rendered when it was logged
+            return f"[{record.levelname}] <unformattable log message: {record.msg!r}>"
 
     @classmethod
     def get_logger(cls, name=__name__):
@@ -1688,8 +1826,17 @@ class SessionLogger:
 
         # Single combined filter
         def filter(record):
+            if record.levelno < cls.log_level.get():
+                return False
             record.session_id = cls.session_id.get()
-            return record.levelno >= cls.log_level.get()
+            # Render the message once; both handlers (and a later buffer flush) reuse it.
+            # Filters run outside Handler.handleError, so on a formatting error leave the
+            # record untouched and let the handlers report it instead of raising here.
+            try:
+                record.msg, record.args = record.getMessage(), None
+            except Exception:
+                pass
+            return True
 
         logger.addFilter(filter)
 
@@ -1698,14 +1845,149 @@ class SessionLogger:
         console.setFormatter(logging.Formatter("[%(levelname)s] [%(session_id)s] %(message)s"))
         logger.addHandler(console)
 
-        # Memory handler
+        # Memory handler (stores records; formatting is deferred to format_logs())
         mem = logging.Handler()
-        mem.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-        mem.emit = lambda r: cls.logs[r.session_id].append(mem.format(r)) if r.session_id else None
+        mem.emit = lambda r: cls.logs[r.session_id].append(r) if r.session_id else None
         logger.addHandler(mem)
 
         return logger
 
+class LazyStr:
+    """Log argument that defers building its text until a handler formats the record.
+
+    ``SessionLogger`` keeps the logger at DEBUG and drops records in a filter, so
+    ``isEnabledFor`` cannot skip expensive arguments.  Records rejected by the filter
+    are never formatted, so wrapping the work in ``LazyStr`` makes it free when the
+    session log level is higher.  The text is built once and reused by every handler.
+    """
+
+    __slots__ = ("_build", "_text")
+
+    def __init__(self, build: Callable[[], str]) -> None:
+        self._build = build
+        self._text: str | None = None
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = self._build()
+        return self._text
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire ``ttl`` seconds after being set.
+
+    Expiry uses ``time.monotonic`` so it is immune to wall-clock jumps.  The least
+    recently used entry is evicted once ``maxsize`` is exceeded.
+    """
+
+    __slots__ = ("maxsize", "ttl", "_data")
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Any, Tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Any, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class ChatMessageCoalescer:
+    """Event emitter wrapper that coalesces rapid ``chat:message`` updates.
+
+    Every ``chat:message`` event carries the full message so far, so only the latest
+    one per ``interval`` needs to reach the UI; the rest are dropped.  A pending update
+    is sent once the interval elapses, and any other event flushes it first so the UI
+    always sees events in order.  All sends (including the delayed one) run under one
+    lock, so a slow emitter can never let a newer event overtake an older update.
+    """
+
+    __slots__ = ("_emit", "_interval", "_pending", "_last_sent", "_timer", "_lock", "_error")
+
+    def __init__(
+        self,
+        emit: Callable[[dict[str, Any]], Awaitable[None]],
+        interval: float = CHAT_MESSAGE_EMIT_INTERVAL,
+    ) -> None:
+        self._emit = emit
+        self._interval = interval
+        self._pending: dict[str, Any] | None = None
+        self._last_sent = 0.0
+        self._timer: asyncio.Task | None = None  # only set while the delayed send is still sleeping
+        self._lock = asyncio.Lock()
+        self._error: Exception | None = None     # raised by the delayed send; re-raised to the caller
+
+    async def __call__(self, event: dict[str, Any]) -> None:
+        if event.get("type") != "chat:message":
+            self._cancel_timer()
+            async with self._lock:
+                self._raise_deferred_error()
+                await self._send_pending()
+                await self._emit(event)
+            return
+
+        wait = self._last_sent + self._interval - time.monotonic()
+        if wait <= 0 and self._timer is None:
+            async with self._lock:
+                self._raise_deferred_error()
+                self._pending = None
+                self._last_sent = time.monotonic()
+                await self._emit(event)
+            return
+
+        self._pending = event  # newer content supersedes any pending update
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later(max(wait, 0.0)))
+
+    async def flush(self) -> None:
+        """Send the pending ``chat:message`` (if any), after any send already in progress."""
+        self._cancel_timer()
+        async with self._lock:
+            self._raise_deferred_error()
+            await self._send_pending()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _raise_deferred_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._timer = None  # from here on the send must not be cancelled by flush()
+        async with self._lock:
+            try:
+                await self._send_pending()
+            except Exception as e:  # nobody awaits this task; surface it on the next send
+                self._error = e
+
+    async def _send_pending(self) -> None:
+        event, self._pending = self._pending, None
+        if event is not None:
+            self._last_sent = time.monotonic()
+            await self._emit(event)
+
 class ExpandableStatusIndicator:
     """
     Real‑time, **expandable progress log** for chat assistants
@@ -1774,7 +2056,9 @@ class ExpandableStatusIndicator:
 
     """
 
-    # Regex reused for fast replacement of the existing block.
+    __slots__ = ("_event_emitter", "_items", "_started", "_done")
+
+    # Regex reused for fast replacement of the existing (leading) block.
     _BLOCK_RE = re.compile(
         r"<details\s+type=\"status\".*?</details>", re.DOTALL | re.IGNORECASE
     )
@@ -1859,11 +2143,10 @@ class ExpandableStatusIndicator:
 
     async def _render(self, assistant_message: str, emit: bool) -> str:
         block = self._render_status_block()
-        full_msg = (
-            self._BLOCK_RE.sub(lambda _: block, assistant_message, 1)
-            if self._BLOCK_RE.search(assistant_message)
-            else f"{block}{assistant_message}"
-        )
+        # The block is always the first element, so an anchored match only walks
+        # the block itself instead of rescanning the whole (growing) message.
+        existing = self._BLOCK_RE.match(assistant_message)
+        full_msg = f"{block}{assistant_message[existing.end():] if existing else assistant_message}"
         if emit and self._event_emitter:
             await self._event_emitter({"type": "chat:message", "data": {"content": full_msg}})
         return full_msg
@@ -1880,8 +2163,10 @@ class ExpandableStatusIndicator:
                 if sub_lines:
                     lines.append(f"  - {sub_lines[0]}")  # first line with dash
                     # All subsequent lines indented 4 spaces to align with markdown
-                    if len(sub_lines) > 1:
-                        lines.extend(textwrap.indent("\n".join(sub_lines[1:]), "    ").splitlines())
+                    # (whitespace-only lines stay bare, as textwrap.indent does).
+                    lines.extend(
+                        f"    {line}" if line.strip() else line for line in sub_lines[1:]
+                    )
 
         body_md = "\n".join(lines) if lines else "_No status yet._"
         summary = self._items[-1][0] if self._items else "Working…"
@@ -1927,7 +2212,8 @@ def persist_openai_response_items(
         {"role": "assistant", "done": True, "item_ids": []},
     )
 
-    now = int(datetime.datetime.utcnow().timestamp())
+    now = int(time.time())  # utcnow().timestamp() reads the naive UTC time as local time
+    item_ids = message_bucket["item_ids"]
     hidden_uid_markers: List[str] = []
 
     for payload in items:
@@ -1938,15 +2224,34 @@ def persist_openai_response_items(
             "payload":    payload,
             "message_id": message_id,
         }
-        message_bucket["item_ids"].append(item_id)
-        hidden_uid_marker = wrap_marker(
-            create_marker(payload.get("type", "unknown"), ulid=item_id)
+        item_ids.append(item_id)
+        hidden_uid_markers.append(
+            wrap_marker(create_marker(payload.get("type", "unknown"), ulid=item_id))
         )
-        hidden_uid_markers.append(hidden_uid_marker)
 
     Chats.update_chat_by_id(chat_id, chat_model.chat)
     return "".join(hidden_uid_markers)
 
+def enable_native_function_calling(openwebui_model_id: str) -> bool:
+    """Set ``params.function_calling = "native"`` on an Open WebUI model.
+
+    :param openwebui_model_id: Fully qualified model ID, e.g. ``openai_responses.gpt-4o``.
+    :return: ``True`` if the model was updated, ``False`` if missing or already native.
+    """
+    model = Models.get_model_by_id(openwebui_model_id)
+    if not model:
+        return False
+
+    params = dict(model.params or {})
+    if params.get("function_calling") == "native":
+        return False
+
+    form_data = model.model_dump()
+    form_data["params"] = params
+    form_data["params"]["function_calling"] = "native"
+    Models.update_model_by_id(openwebui_model_id, ModelForm(**form_data))
+    return True
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 7. General-Purpose Utility Functions (Data transforms & patches)
 # ─────────────────────────────────────────────────────────────────────────────
@@ -1969,6 +2274,166 @@ def merge_usage_stats(total, new):
     return total
 
 
+def iter_output_text(items: Iterable[dict[str, Any]]) -> Iterator[str]:
+    """Yield the ``output_text`` parts of every ``message`` item in a Responses ``output`` list."""
+    for item in items:
+        if item.get("type") != "message":
+            continue
+        for content in item.get("content", []):
+            if content.get("type") == "output_text":
+                yield content.get("text", "")
+
+
+async def prefetch(source: AsyncIterator[Any], maxsize: int) -> AsyncGenerator[Any, None]:
+    """Iterate ``source`` from a background task, buffering up to ``maxsize`` items.
+
+    Lets the producer (e.g. a network stream) make progress while the consumer awaits
+    its own I/O.  Errors from ``source`` are re-raised to the consumer after any items
+    already buffered; closing the returned generator cancels the producer.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+    done = object()
+    error: BaseException | None = None
+
+    async def produce() -> None:
+        nonlocal error
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as exc:
+            error = exc
+        finally:
+            if hasattr(source, "aclose"):
+                await source.aclose()  # release the underlying response promptly
+        await queue.put(done)
+
+    task = asyncio.create_task(produce())
+    try:
+        while (item := await queue.get()) is not done:
+            yield item
+        if error is not None:
+            raise error
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+# Valve JSON only changes when an admin edits it, so parse each distinct value once.
+@functools.lru_cache(maxsize=8)
+def build_mcp_tools_cached(mcp_json: str) -> Tuple[dict, ...]:
+    """Cached ``ResponsesBody._build_mcp_tools``; callers copy the tool dicts before use."""
+    return tuple(ResponsesBody._build_mcp_tools(mcp_json))
+
+
+@functools.lru_cache(maxsize=8)
+def parse_model_ids(model_id_csv: str) -> Tuple[str, ...]:
+    """Split the comma-separated ``MODEL_ID`` valve into stripped, non-empty IDs (cached)."""
+    return tuple(model_id for model_id in map(str.strip, model_id_csv.split(",")) if model_id)
+
+
+@functools.lru_cache(maxsize=8)
+def parse_user_location(raw: str) -> dict:
+    """Cached ``json.loads`` of ``WEB_SEARCH_USER_LOCATION``; callers copy the result."""
+    return json.loads(raw)
+
+
+# Model IDs come from a small, fixed set, so normalize each distinct string once.
+@functools.lru_cache(maxsize=64)
+def resolve_model_alias(model: str) -> Tuple[str, Optional[str]]:
+    """Return ``(model_id, reasoning_effort)`` for a raw, possibly prefixed or pseudo model ID.
+
+    Strips the ``openai_responses.`` prefix, lowercases official IDs and maps
+    pseudo-models (e.g. ``gpt-5-thinking-high``) to their real model and effort.
+    """
+    key = model.strip().removeprefix("openai_responses.").lower()
+    return MODEL_ALIASES.get(key, (key, None))  # pass through official IDs as lowercase
+
+
+@functools.lru_cache(maxsize=64)
+def get_model_family(model: str) -> str:
+    """Return the family-level model name (e.g. ``o3`` from ``o3-2025-04-16``)."""
+    # Plain slice checks for a trailing ``-YYYY-MM-DD``; most IDs have no date suffix.
+    suffix = model[-11:]
+    if (
+        len(suffix) == 11
+        and suffix[0] == suffix[5] == suffix[8] == "-"
+        and suffix[1:5].isdigit() and suffix[6:8].isdigit() and suffix[9:].isdigit()
+    ):
+        return model[:-11]
+    return model
+
+
+def model_features(model_family: str) -> frozenset[str]:
+    """Return the ``FEATURE_SUPPORT`` keys that list ``model_family``."""
+    return MODEL_FEATURES.get(model_family, frozenset())
+
+
+@functools.lru_cache(maxsize=256)
+def url_domain(url: str) -> str:
+    """Return the lowercase host of ``url`` without a leading ``www.`` (cached per URL)."""
+    return urlparse(url).netloc.lower().removeprefix("www.")
+
+
+# Same output as ``json.dumps(v)``, minus its per-call keyword checks (values are shown as-is to the user).
+_encode_arg_value = json.JSONEncoder().encode
+
+
+def describe_output_item(item: dict[str, Any]) -> Tuple[Optional[str], str]:
+    """Return the ``(status_title, status_content)`` shown when an output item completes.
+
+    A ``None`` title means no status line should be emitted for the item.
+    """
+    item_type = item.get("type", "")
+    if item_type in ITEM_STATUS_TITLES:
+        return ITEM_STATUS_TITLES[item_type], ""
+
+    item_name = item.get("name", "unnamed_tool")
+    if item_type == "function_call":
+        arguments = json.loads(item.get("arguments") or "{}")
+        args_formatted = ", ".join(f"{k}={_encode_arg_value(v)}" for k, v in arguments.items())
+        return (
+            f"🛠️ Running the {item_name} tool…",
+            wrap_code_block(f"{item_name}({args_formatted})", "python"),
+        )
+
+    if item_type == "web_search_call":
+        action = item.get("action", {})
+        if action.get("type") == "search":
+            query = action.get("query")
+            return (f"🔍 Searching the web for: `{query}`" if query else "🔍 Searching the web"), ""
+        if action.get("type") == "open_page":
+            url = action.get("url")
+            return "🔍 Opening web page…", (f"URL: `{url}`" if url else "")
+        return "🔍 Hmm, let me quickly check online…", ""
+
+    return f"Running `{item_name}`", ""
+
+
+_json_loads = orjson.loads if orjson else json.loads
+
+def _encode_request_body(body: dict[str, Any]) -> bytes:
+    """Serialize a request body once into compact UTF-8 JSON for ``session.post(data=...)``.
+
+    The stdlib path escapes to ASCII like ``session.post(json=...)`` did, so lone
+    surrogates (e.g. a truncated emoji from the browser) still encode.
+    """
+    if orjson:
+        with contextlib.suppress(TypeError):  # e.g. ints beyond 64 bits, non-str keys → stdlib fallback
+            return orjson.dumps(body)
+    return json.dumps(body, separators=(",", ":")).encode()
+
+
+def _json_dumps_debug(obj: Any, *, indent: bool = True) -> str:
+    """JSON text for DEBUG logs (indented or compact); uses ``orjson`` when available."""
+    if orjson:
+        with contextlib.suppress(TypeError):  # e.g. ints beyond 64 bits → stdlib fallback
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None).decode()
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
 def wrap_code_block(text: str, language: str = "python") -> str:
     """Wrap ``text`` in a fenced Markdown code block.
 
@@ -2003,13 +2468,15 @@ def remove_details_tags_by_type(text: str, removal_types: list[str]) -> str:
 # Helper utilities for persistent item markers
 ULID_LENGTH = 16
 CROCKFORD_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+# Maps each random byte to ALPHABET[byte % 32]; 256 is a multiple of 32, so it is unbiased.
+_ULID_TABLE = (CROCKFORD_ALPHABET * 8).encode("ascii")
 
 _SENTINEL = "[openai_responses:v2:"
 _RE = re.compile(
     rf"\[openai_responses:v2:(?P<kind>[a-z0-9_]{{2,30}}):"
     rf"(?P<ulid>[A-Z0-9]{{{ULID_LENGTH}}})(?:\?(?P<query>[^\]]+))?\]:\s*#",
-    re.I,
 )
+_KIND_RE = re.compile(r"[a-z0-9_]{2,30}")
 
 def _qs(d: dict[str, str]) -> str:
     return "&".join(f"{k}={v}" for k, v in d.items()) if d else ""
@@ -2019,7 +2486,7 @@ def _parse_qs(q: str) -> dict[str, str]:
 
 
 def generate_item_id() -> str:
-    return ''.join(secrets.choice(CROCKFORD_ALPHABET) for _ in range(ULID_LENGTH))
+    return os.urandom(ULID_LENGTH).translate(_ULID_TABLE).decode("ascii")
 
 def create_marker(
     item_type: str,
@@ -2028,7 +2495,7 @@ def create_marker(
     model_id: str | None = None,
     metadata: dict[str, str] | None = None,
 ) -> str:
-    if not re.fullmatch(r"[a-z0-9_]{2,30}", item_type):
+    if not _KIND_RE.fullmatch(item_type):
         raise ValueError("item_type must be 2-30 chars of [a-z0-9_]")
     meta = {**(metadata or {})}
     if model_id:
@@ -2049,25 +2516,38 @@ def parse_marker(marker: str) -> dict:
     uid, _, q = rest.partition("?")
     return {"version": "v2", "item_type": kind, "ulid": uid, "metadata": _parse_qs(q)}
 
-def extract_markers(text: str, *, parsed: bool = False) -> list:
-    found = []
+def _iter_marker_matches(text: str) -> Iterator[Tuple[re.Match[str], str]]:
+    """Yield ``(match, marker)`` for every marker in ``text`` in a single regex pass."""
     for m in _RE.finditer(text):
-        raw = f"openai_responses:v2:{m.group('kind')}:{m.group('ulid')}"
-        if m.group("query"):
-            raw += f"?{m.group('query')}"
-        found.append(parse_marker(raw) if parsed else raw)
-    return found
+        kind, ulid, query = m.group("kind", "ulid", "query")
+        marker = f"openai_responses:v2:{kind}:{ulid}"
+        yield m, (f"{marker}?{query}" if query else marker)
+
+def extract_markers(text: str, *, parsed: bool = False) -> list:
+    if _SENTINEL not in text:
+        return []
+    if not parsed:
+        return [marker for _, marker in _iter_marker_matches(text)]
+    # Build parsed markers from the match groups rather than re-splitting each string.
+    return [
+        {
+            "version": "v2",
+            "item_type": m.group("kind"),
+            "ulid": m.group("ulid"),
+            "metadata": _parse_qs(m.group("query")),
+        }
+        for m in _RE.finditer(text)
+    ]
 
 def split_text_by_markers(text: str) -> list[dict]:
+    if _SENTINEL not in text:
+        return [{"type": "text", "text": text}] if text else []
     segments = []
     last = 0
-    for m in _RE.finditer(text):
+    for m, marker in _iter_marker_matches(text):
         if m.start() > last:
             segments.append({"type": "text", "text": text[last:m.start()]})
-        raw = f"openai_responses:v2:{m.group('kind')}:{m.group('ulid')}"
-        if m.group("query"):
-            raw += f"?{m.group('query')}"
-        segments.append({"type": "marker", "marker": raw})
+        segments.append({"type": "marker", "marker": marker})
         last = m.end()
     if last < len(text):
         segments.append({"type": "text", "text": text[last:]})